@@ -16,6 +16,76 @@ FAST2SMS_API_KEY = os.getenv("FAST2SMS_API_KEY")
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 6 * 30 * 24 * 60  # 6 months
 MAX_DISTANCE_KM = 15
+# Feed ranking: weight of each score component in utils/scoring.py (0 disables it)
+FEED_SCORE_WEIGHTS = {
+    "recency": 1.0,
+    "distance": 1.0,
+    "popularity": 0.5,
+    "affinity": 1.5,
+}
+FEED_RECENCY_HALF_LIFE_HOURS = 72
+# Sparse areas widen the feed radius from MAX_DISTANCE_KM, doubling up to this limit
+FEED_MAX_RADIUS_KM = 240
+# Personalised feed: categories of the user's history that get their own phase, the rest are filler
+FEED_MAX_RANKED_CATEGORIES = 20
+# Anonymous GET /ads/ pages are cached per normalised query
+ANON_FEED_CACHE_TTL_SECONDS = 30
+ANON_FEED_CACHE_MAX_ENTRIES = 2048
+# uid -> username/profile image of ad owners, used to format feed pages
+OWNER_CACHE_TTL_SECONDS = 600
+OWNER_CACHE_MAX_ENTRIES = 50000
+# GET /ads/facets results per normalised query
+FACETS_CACHE_TTL_SECONDS = 60
+FACETS_CACHE_MAX_ENTRIES = 1024
+FACETS_PRICE_BUCKETS = 8
+# S3: threads running blocking boto3 calls, uploads in flight and multipart sizes
+S3_MAX_WORKERS = 16
+S3_MAX_CONCURRENT_UPLOADS = 8
+S3_MULTIPART_THRESHOLD_MB = 8
+S3_MULTIPART_CHUNK_MB = 8
+# Shared stored objects: how long a new reference waits for a deletion in progress, and how often it checks
+OBJECT_DELETE_WAIT_SECONDS = 30
+OBJECT_DELETE_POLL_MS = 50
+# Ad images: WebP variants generated at upload (longest side in px) and image worker processes
+IMAGE_VARIANT_SIZES = {"thumb": 320, "detail": 1280}
+IMAGE_WEBP_QUALITY = 80
+IMAGE_PROCESS_WORKERS = os.cpu_count() or 2
+# Presigned direct-to-storage uploads
+PRESIGNED_UPLOAD_EXPIRE_SECONDS = 15 * 60
+MAX_IMAGE_UPLOAD_BYTES = 10 * 1024 * 1024
+ALLOWED_IMAGE_CONTENT_TYPES = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp", "image/heic": "heic"}
+# Images per ad, and how many of one request's images are processed/uploaded at once
+MAX_AD_IMAGES = 10
+AD_IMAGE_UPLOAD_CONCURRENCY = 4
+# Bulk ad import: rows validated, charged and inserted per chunk, and rows per file
+IMPORT_CHUNK_SIZE = 500
+IMPORT_MAX_ROWS = 10000
+# Buffered ad view counts: flush interval, pending views that force an early flush, $inc ops per bulk_write
+VIEW_FLUSH_INTERVAL_MS = 1000
+VIEW_FLUSH_MAX_PENDING = 5000
+VIEW_FLUSH_BATCH_SIZE = 1000
+# Most recently viewed ads kept in a user's history
+HISTORY_MAX_LENGTH = 10
+# GET /ads/{ad_id} payloads of hot ads
+AD_DETAIL_CACHE_TTL_SECONDS = 30
+AD_DETAIL_CACHE_MAX_ENTRIES = 5000
+# Cache-Control of conditional GET endpoints, clients revalidate with the ETag
+CATEGORIES_CACHE_CONTROL = "public, max-age=3600"
+AD_DETAIL_CACHE_CONTROL = "public, no-cache"
+USER_ME_CACHE_CONTROL = "private, no-cache"
+# Expired ads are moved to ads_archive by a background sweep, this many per batch
+EXPIRY_SWEEP_INTERVAL_SECONDS = 300
+EXPIRY_SWEEP_BATCH_SIZE = 500
+# Ads that existed before expiry was introduced expire no sooner than this many days after the backfill
+EXPIRY_BACKFILL_GRACE_DAYS = 14
+# Ads archived per batch when a user deletes their account
+USER_DELETE_BATCH_SIZE = 500
+# Background cleanup of removed ads: poll for jobs of other processes, lease of a claimed job
+CLEANUP_JOB_POLL_SECONDS = 5
+CLEANUP_JOB_LEASE_SECONDS = 600
+# Failed cleanup jobs are retried after base * 2^(attempt - 1) seconds, at most max
+CLEANUP_JOB_RETRY_BASE_SECONDS = 30
+CLEANUP_JOB_RETRY_MAX_SECONDS = 3600
 # ✅ Replace with your desired dev-only credentials
 DOCS_USERNAME = "admin"
 DOCS_PASSWORD = "secret123"
\ No newline at end of file
@@ -1,15 +1,24 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from database import connect_to_mongo, close_mongo_connection
-from routers import auth, users, ads, favorites, chatrooms, categories
+from routers import auth, users, ads, favorites, chatrooms, categories, uploads
 from database import get_database
 from utils.load_categories import initialize_categories_collection
 from utils.load_follow_relations import initialize_follow_relations_collections
+from utils.load_ads import initialize_ads_collection
+from utils.taxonomy import load_taxonomy, reload_taxonomy
 from fastapi.openapi.docs import get_swagger_ui_html
 from config import DOCS_USERNAME, DOCS_PASSWORD
 from fastapi.openapi.utils import get_openapi
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi import Depends, status, HTTPException
+from utils.cache import CACHES
+from utils.s3 import s3_client
+from utils.images import shutdown_process_pool
+from utils.view_counter import view_counter
+from utils.expiry import expiry_sweeper
+from utils.cleanup_jobs import cleanup_worker, initialize_cleanup_jobs_collection
+from utils.variant_worker import variant_worker
 import secrets
 
 app = FastAPI(title="Listinker API", description="Classified Ads Platform API", version="1.0.0", docs_url=None, redoc_url=None, openapi_url=None)
@@ -20,6 +29,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Feed-Radius-Km"],
 )
 
 @app.on_event("startup")
@@ -27,10 +37,23 @@ async def startup():
     await connect_to_mongo()
     db = await get_database()
     await initialize_categories_collection(db)
+    await load_taxonomy(db)
     await initialize_follow_relations_collections(db)
+    await initialize_ads_collection(db)
+    await initialize_cleanup_jobs_collection(db)
+    view_counter.start(db)
+    cleanup_worker.start(db)
+    expiry_sweeper.start(db)
+    variant_worker.start(db)
 
 @app.on_event("shutdown")
 async def shutdown():
+    await variant_worker.stop()
+    await expiry_sweeper.stop()
+    await cleanup_worker.stop()
+    await view_counter.stop()
+    shutdown_process_pool()
+    s3_client.shutdown()
     await close_mongo_connection()
 
 app.include_router(auth.router)
@@ -39,6 +62,7 @@ app.include_router(ads.router)
 app.include_router(favorites.router)
 app.include_router(categories.router)
 app.include_router(chatrooms.router)
+app.include_router(uploads.router)
 
 @app.get("/")
 async def root():
@@ -57,6 +81,17 @@ def verify_docs_access(credentials: HTTPBasicCredentials = Depends(security)):
         )
     return True
 
+@app.get("/cache-stats", include_in_schema=False)
+async def get_cache_stats(credentials: HTTPBasicCredentials = Depends(verify_docs_access)):
+    # Hit/miss counters of the in-process caches, used to size them
+    return {**{name: cache.stats() for name, cache in CACHES.items()}, "view_counter": view_counter.stats()}
+
+@app.post("/taxonomy/reload", include_in_schema=False)
+async def reload_category_taxonomy(credentials: HTTPBasicCredentials = Depends(verify_docs_access)):
+    # Call after editing the categories/sub_categories collections
+    taxonomy = await reload_taxonomy(await get_database())
+    return {"categories": len(taxonomy.categories), "sub_categories": len(taxonomy.sub_categories)}
+
 # ✅ Override Swagger UI
 @app.get("/docs", include_in_schema=False)
 async def custom_swagger_ui(credentials: HTTPBasicCredentials = Depends(verify_docs_access)):
@@ -1,7 +1,8 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from fastapi import Form, HTTPException
+from utils.geo import parse_location
 
 class Ad(BaseModel):
     ad_id: str
@@ -9,9 +10,14 @@ class Ad(BaseModel):
     description: str
     price: int
     image: List[str] = []
+    # Keys of the resized variants of each image, in the same order as image
+    image_variants: List[Dict[str, str]] = []
     category: List[int]
     ad_loc: List[float]
+    ad_geo: Optional[dict] = None
     time_created: str
+    # From the parent category's int_date, None if the category has no lifetime
+    expires_at: Optional[datetime] = None
     owner: str
     status: str = "under-review"
     views: int = 0
@@ -36,19 +42,9 @@ class AdCreate(BaseModel):
         status: str = Form("under-review")
     ):
         try:
-            coords = [float(x.strip()) for x in ad_loc.split(",")]
-            if len(coords) != 2:
-                raise ValueError("length")
+            coords = parse_location(ad_loc)
         except ValueError as e:
-            if str(e) == "length":
-                raise HTTPException(
-                    status_code=422,
-                    detail="Location must contain exactly two numbers: latitude and longitude"
-                )
-            raise HTTPException(
-                status_code=422,
-                detail="Invalid location format. Must be two comma-separated numbers"
-            )
+            raise HTTPException(status_code=422, detail=str(e))
 
         return cls(
             title=title,
@@ -80,20 +76,9 @@ class AdUpdate(BaseModel):
         parsed_loc = None
         if ad_loc:
             try:
-                coords = [float(x.strip()) for x in ad_loc.split(",")]
-                if len(coords) != 2:
-                    raise ValueError("length")
-                parsed_loc = coords
+                parsed_loc = parse_location(ad_loc)
             except ValueError as e:
-                if str(e) == "length":
-                    raise HTTPException(
-                        status_code=422,
-                        detail="Location must contain exactly two numbers: latitude and longitude"
-                    )
-                raise HTTPException(
-                    status_code=422,
-                    detail="Invalid location format. Must be two comma-separated numbers"
-                )
+                raise HTTPException(status_code=422, detail=str(e))
 
         return cls(
             title=title,
@@ -104,20 +89,53 @@ class AdUpdate(BaseModel):
             status=status
         )
 
+class AdImagesUpdate(BaseModel):
+    # The ad's image keys in their new order, keys left out are removed
+    image: List[str]
+
 class AdResponse(BaseModel):
     ad_id: str
     title: str
     description: str
     price: int
     image: List[str]
+    image_variants: List[Dict[str, str]] = []
     category: List[int]
     ad_loc: List[float]
     time_created: str
+    expires_at: Optional[datetime] = None
     owner: str
     status: str
     views: int
     favorited: int
 
+class ArchivedAdResponse(BaseModel):
+    ad_id: str
+    title: str
+    price: int
+    category: List[int]
+    image: Optional[str] = None
+    views: int = 0
+    favorited: int = 0
+    time_created: str
+    expires_at: Optional[datetime] = None
+    archive_reason: str
+    archived_at: datetime
+
+class CleanupJobResponse(BaseModel):
+    job_id: str
+    status: str  # queued, running or done, failed attempts are queued again
+    attempts: int = 0
+    ad_ids: List[str]
+    steps_done: List[str]
+    steps_total: int
+    # Documents changed by each finished step
+    affected: Dict[str, int]
+    # Error of the last failed attempt
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
 class AdFeedResponse(BaseModel):
     title: str
     description: str
@@ -127,4 +145,21 @@ class AdFeedResponse(BaseModel):
     username: str
     ad_id: str
     time_created: str
-    category: List[int]
\ No newline at end of file
+    category: List[int]
+    distance: Optional[float] = None
+
+class CategoryFacet(BaseModel):
+    category: int
+    count: int
+
+class PriceBucket(BaseModel):
+    min: int
+    max: int
+    count: int
+
+class AdFacetsResponse(BaseModel):
+    total: int
+    categories: List[CategoryFacet]
+    price_buckets: List[PriceBucket]
+    nearby: Optional[int] = None
+    radius_km: Optional[float] = None
\ No newline at end of file
@@ -17,3 +17,4 @@ class Chatroom(BaseModel):
     created_at: str
     last_message: str = ""
     last_message_time: str = ""
+    status: str = "open"  # "closed" once the ad was deleted, sold or expired
@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field, EmailStr
 from fastapi import Form, HTTPException
 from typing import List, Optional
 from datetime import datetime
+from config import HISTORY_MAX_LENGTH
 
 class User(BaseModel):
     username: str
@@ -12,7 +13,7 @@ class User(BaseModel):
     email_verified: bool = False
     uid: str
     favorites: List[str] = []
-    history: List[str] = Field(default=[], max_length=10)
+    history: List[str] = Field(default=[], max_length=HISTORY_MAX_LENGTH)
     my_ads: List[str] = []
     chatrooms: List[str] = []
     followers: str
@@ -1,24 +1,86 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query
-from models.ad import Ad, AdCreate, AdUpdate, AdResponse, AdFeedResponse
-from config import MAX_DISTANCE_KM
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query, Response, Request
+from fastapi.responses import StreamingResponse
+from models.ad import Ad, AdCreate, AdUpdate, AdImagesUpdate, AdResponse, AdFeedResponse, AdFacetsResponse
+from models.ad import ArchivedAdResponse, CleanupJobResponse
+from config import MAX_DISTANCE_KM, FEED_MAX_RADIUS_KM, ANON_FEED_CACHE_TTL_SECONDS, ANON_FEED_CACHE_MAX_ENTRIES
+from config import FEED_MAX_RANKED_CATEGORIES
+from config import FACETS_CACHE_TTL_SECONDS, FACETS_CACHE_MAX_ENTRIES, FACETS_PRICE_BUCKETS, MAX_AD_IMAGES
+from config import IMPORT_CHUNK_SIZE, IMPORT_MAX_ROWS, HISTORY_MAX_LENGTH
+from config import AD_DETAIL_CACHE_TTL_SECONDS, AD_DETAIL_CACHE_MAX_ENTRIES, AD_DETAIL_CACHE_CONTROL
 from utils.jwt import verify_token, get_optional_uid
-from utils.s3 import s3_client
+from utils.s3 import upload_prefix
 from database import get_database
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pymongo import DESCENDING
-from collections import Counter
+from pymongo.errors import BulkWriteError
+from collections import Counter, defaultdict
+import asyncio
+import json
 from typing import List
 import uuid
 from datetime import datetime
-from math import radians, cos, sin, asin, sqrt
 from typing import Optional
+from utils.geo import to_geo_point, geo_near_stage, geo_within_filter, haversine
+from utils.cursor import encode_cursor, decode_cursor
+from utils.scoring import rank_ads
+from utils.cache import TTLCache
+from utils.owners import get_owner_profiles
+from utils.taxonomy import resolve_parent_category
+from utils.credits import consume_credit, refund_credit, reserve_credits, refund_credits
+from utils.images import upload_images_with_variants, delete_images_with_variants, aligned_image_variants
+from utils.images import check_image_size
+from utils.objects import retain_objects
+from utils.bulk_import import import_format, iter_import_rows, parse_import_row, upload_errors
+from utils.views import AD_READ_PROJECTION, record_view
+from utils.view_counter import view_counter
+from utils.etag import etag_response
+from utils.expiry import ad_expires_at, live_ads_filter
+from utils.archive import archive_ads, on_archived, ARCHIVE_REASONS
+from utils.cleanup_jobs import CLEANUP_STEPS
+from utils.variant_worker import variant_worker
 
 router = APIRouter(prefix="/ads", tags=["ads"])
 
+# Finished anonymous feed pages keyed on the normalised query, see get_ads
+anonymous_feed_cache = TTLCache("anonymous_feed", ANON_FEED_CACHE_MAX_ENTRIES, ANON_FEED_CACHE_TTL_SECONDS)
+
+def invalidate_feed_cache(categories: List[int]):
+    """Drop cached anonymous feed pages that could contain ads of these categories."""
+    categories = set(categories or [])
+    anonymous_feed_cache.invalidate(lambda key: key[0] is None or key[0] in categories)
+
+# Serialised AdResponse payloads of recently read ads, see get_ad
+ad_detail_cache = TTLCache("ad_detail", AD_DETAIL_CACHE_MAX_ENTRIES, AD_DETAIL_CACHE_TTL_SECONDS)
+
+def invalidate_ad_detail(ad_id: str):
+    """Drop the cached detail of an ad after it (or its favorited count) changed."""
+    ad_detail_cache.pop(ad_id)
+
+def patch_cached_views(ad_id: str, count: int):
+    # Flushed views are in the database now but not in a payload read before, add
+    # them so the count doesn't drop once they leave the view counter's buffer
+    payload = ad_detail_cache.peek(ad_id)
+    if payload is not None:
+        payload["views"] += count
+
+view_counter.on_flush(patch_cached_views)
+
+def forget_archived_ads(ads: List[dict]):
+    for ad in ads:
+        invalidate_ad_detail(ad["ad_id"])
+    invalidate_feed_cache([category for ad in ads for category in ad.get("category", [])])
+
+on_archived(forget_archived_ads)
+# Variants rendered in the background replace the original in the detail payload
+variant_worker.on_variants(invalidate_ad_detail)
+
+# Facet counts per normalised query, short-lived so they stay roughly current
+facets_cache = TTLCache("facets", FACETS_CACHE_MAX_ENTRIES, FACETS_CACHE_TTL_SECONDS)
+
 @router.post("/", response_model=AdResponse)
 async def create_ad(
     ad_create: AdCreate = Depends(AdCreate.as_form),
-    image: UploadFile = File(...),  # File(...) makes image REQUIRED
+    image: List[UploadFile] = File(...),  # File(...) makes image REQUIRED, may be sent several times
     uid: str = Depends(verify_token)
 ):
     db = await get_database()
@@ -30,87 +92,50 @@ async def create_ad(
     if not category_ids:
         raise HTTPException(status_code=400, detail="At least one category ID is required.")
 
-    # Check each category ID against sub_categories collection
-    # Each category ID should be a valid numb_id of a sub_category
-    valid_category_ids = []
-    for category_id in category_ids:
-        doc = await db.sub_categories.find_one({
-            "numb_id": category_id
-        })
-        if not doc:
-            raise HTTPException(status_code=400, detail=f"Category ID {category_id} is not valid.")
-        valid_category_ids.append(category_id)
-    
-    # All category IDs must be valid
-    if len(valid_category_ids) != len(category_ids):
-        raise HTTPException(status_code=400, detail="One or more category IDs are not valid.")
-    
-    # Get the parent_id for credit checking (all categories should belong to the same parent)
-    parent_ids = set()
-    for category_id in valid_category_ids:
-        doc = await db.sub_categories.find_one({
-            "numb_id": category_id
-        })
-        if doc:
-            parent_ids.add(doc["parent_id"])
-    
-    if len(parent_ids) > 1:
-        raise HTTPException(status_code=400, detail="Provided category IDs belong to multiple unrelated categories.")
-    
-    matched_numb_id = list(parent_ids)[0] if parent_ids else None
-    if not matched_numb_id:
-        raise HTTPException(status_code=400, detail="No valid parent category found for the provided category IDs.")
-
-    # Credit check
-    free_credit_doc = await db.free_credits.find_one({
-        "UID": uid,
-        "category": matched_numb_id,
-        "credits": {"$gt": 0}
-    })
-
-    paid_credit_doc = None
-    used_free_credit = False
-
-    if free_credit_doc:
-        # Use free credit
-        await db.free_credits.update_one(
-            {"_id": free_credit_doc["_id"]},
-            {"$inc": {"credits": -1}, "$set": {"updated": now}}
-        )
-        used_free_credit = True
-    else:
-        paid_credit_doc = await db.paid_credits.find_one({
-            "UID": uid,
-            "category": matched_numb_id,
-            "credits": {"$gt": 0}
-        })
-        if paid_credit_doc:
-            await db.paid_credits.update_one(
-                {"_id": paid_credit_doc["_id"]},
-                {"$inc": {"credits": -1}, "$set": {"updated": now}}
-            )
-        else:
-            raise HTTPException(status_code=403, detail="Not enough free or paid credits to create ad")
+    # Each category ID should be a valid numb_id of a sub_category, all of them
+    # under the same parent which is used for credit checking
+    matched_numb_id = resolve_parent_category(category_ids)
 
-    # Upload image to S3 (now mandatory)
+    # Image is mandatory
     if not image:
         raise HTTPException(status_code=400, detail="Image is required to create an ad")
-
-    image_url = await s3_client.upload_file(image)
-
-    # Create the ad
-    new_ad = Ad(
-        ad_id=str(uuid.uuid4()),
-        title=ad_create.title,
-        description=ad_create.description,
-        price=ad_create.price,
-        category=category_ids,
-        ad_loc=ad_create.ad_loc,
-        owner=uid,
-        image=[image_url],
-        time_created=now.isoformat()
-    )
-    await db.ads.insert_one(new_ad.dict())
+    if len(image) > MAX_AD_IMAGES:
+        raise HTTPException(status_code=400, detail=f"An ad can have at most {MAX_AD_IMAGES} images")
+    check_image_size(image)
+
+    # Credit check, takes a free credit first and a paid one otherwise
+    credit_pool = await consume_credit(db, uid, matched_numb_id)
+    if not credit_pool:
+        raise HTTPException(status_code=403, detail="Not enough free or paid credits to create ad")
+
+    image_keys = None
+    try:
+        # Upload the images to S3 along with their feed thumbnail and detail variants
+        image_keys = await upload_images_with_variants(image)
+
+        # Create the ad
+        new_ad = Ad(
+            ad_id=str(uuid.uuid4()),
+            title=ad_create.title,
+            description=ad_create.description,
+            price=ad_create.price,
+            category=category_ids,
+            ad_loc=ad_create.ad_loc,
+            ad_geo=to_geo_point(ad_create.ad_loc),
+            owner=uid,
+            image=[keys["original"] for keys in image_keys],
+            image_variants=image_keys,
+            time_created=now.isoformat(),
+            expires_at=ad_expires_at(matched_numb_id, now)
+        )
+        await db.ads.insert_one(new_ad.dict())
+    except Exception:
+        # The ad was never created, give the credit back and drop the orphaned images
+        await refund_credit(db, uid, matched_numb_id, credit_pool)
+        if image_keys:
+            await delete_images_with_variants(image_keys)
+        raise
+    invalidate_feed_cache(category_ids)
 
     # Update user's ad list
     await db.users.update_one(
@@ -120,160 +145,567 @@ async def create_ad(
 
     return AdResponse(**new_ad.dict())
 
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371  # Radius of Earth in km
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    return R * c
+@router.post("/import")
+async def import_ads(file: UploadFile = File(...), uid: str = Depends(verify_token)):
+    """
+    Create many ads from one NDJSON or CSV file (see utils.bulk_import for the row
+    format). Images are keys of presigned uploads. Rows are processed in chunks of
+    IMPORT_CHUNK_SIZE: validated against the taxonomy, charged with one credit
+    reservation per category and written with a single insert_many. The response
+    streams one NDJSON result per row as chunks finish.
+    """
+    db = await get_database()
+    rows = iter_import_rows(file.file, import_format(file))
+    return StreamingResponse(import_ads_stream(db, uid, rows), media_type="application/x-ndjson")
+
+def import_result(row: int, **result) -> str:
+    return json.dumps({"row": row, **result}) + "\n"
+
+async def import_ads_stream(db, uid: str, rows):
+    chunk = []
+    for count, (number, row) in enumerate(rows, start=1):
+        if count > IMPORT_MAX_ROWS:
+            # Results stay in row order, the rows before the limit come first
+            if chunk:
+                for line in await import_ad_chunk(db, uid, chunk):
+                    yield line
+                chunk = []
+            yield import_result(number, status="error", detail=f"Import is limited to {IMPORT_MAX_ROWS} rows")
+            break
+        chunk.append((number, row))
+        if len(chunk) == IMPORT_CHUNK_SIZE:
+            for line in await import_ad_chunk(db, uid, chunk):
+                yield line
+            chunk = []
+    if chunk:
+        for line in await import_ad_chunk(db, uid, chunk):
+            yield line
+
+async def import_ad_chunk(db, uid: str, chunk: list) -> List[str]:
+    results = {}
+    valid = []
+    prefix = upload_prefix(uid)
+
+    for number, row in chunk:
+        if isinstance(row, str):
+            results[number] = import_result(number, status="error", detail=row)
+            continue
+        try:
+            ad_create, images = parse_import_row(row)
+            if not ad_create.category:
+                raise ValueError("At least one category ID is required.")
+            if not images:
+                raise ValueError("Image is required to create an ad")
+            if len(images) > MAX_AD_IMAGES:
+                raise ValueError(f"An ad can have at most {MAX_AD_IMAGES} images")
+            if len(set(images)) != len(images):
+                raise ValueError("The same image is listed twice")
+            if not all(key.startswith(prefix) for key in images):
+                raise ValueError("Upload key does not belong to this user")
+            parent_id = resolve_parent_category(ad_create.category)
+        except HTTPException as e:
+            results[number] = import_result(number, status="error", detail=e.detail)
+            continue
+        except ValueError as e:
+            results[number] = import_result(number, status="error", detail=str(e))
+            continue
+        valid.append((number, parent_id, ad_create, images))
+
+    # Every image must have been uploaded and be within the size limit, checked concurrently
+    image_errors = await upload_errors({key for _, _, _, images in valid for key in images})
+    by_parent = defaultdict(list)
+    for number, parent_id, ad_create, images in valid:
+        error = next((image_errors[key] for key in images if key in image_errors), None)
+        if error:
+            results[number] = import_result(number, status="error", detail=error)
+            continue
+        by_parent[parent_id].append((number, ad_create, images))
+
+    # One credit reservation per parent category instead of one per row
+    parents = list(by_parent)
+    reserved = await asyncio.gather(*(reserve_credits(db, uid, p, len(by_parent[p])) for p in parents))
+
+    now = datetime.utcnow()
+    pending = []  # (row number, parent, pool, ad document)
+    for parent_id, pools in zip(parents, reserved):
+        for index, (number, ad_create, images) in enumerate(by_parent[parent_id]):
+            if index >= len(pools):
+                results[number] = import_result(
+                    number, status="error", detail="Not enough free or paid credits to create ad"
+                )
+                continue
+            new_ad = Ad(
+                ad_id=str(uuid.uuid4()),
+                title=ad_create.title,
+                description=ad_create.description,
+                price=ad_create.price,
+                category=ad_create.category,
+                ad_loc=ad_create.ad_loc,
+                ad_geo=to_geo_point(ad_create.ad_loc),
+                owner=uid,
+                image=images,
+                image_variants=[{"original": key} for key in images],
+                time_created=now.isoformat(),
+                expires_at=ad_expires_at(parent_id, now)
+            )
+            pending.append((number, parent_id, pools[index], new_ad.dict()))
+
+    failed = {}
+    if pending:
+        try:
+            await db.ads.insert_many([doc for _, _, _, doc in pending], ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"]: error.get("errmsg", "Could not create ad") for error in e.details["writeErrors"]}
+
+    refunds = defaultdict(list)
+    created = []
+    for index, (number, parent_id, pool, doc) in enumerate(pending):
+        if index in failed:
+            refunds[parent_id].append(pool)
+            results[number] = import_result(number, status="error", detail=failed[index])
+        else:
+            created.append(doc)
+            results[number] = import_result(number, status="created", ad_id=doc["ad_id"])
+    await asyncio.gather(*(refund_credits(db, uid, p, pools) for p, pools in refunds.items()))
+
+    if created:
+        await db.users.update_one({"uid": uid}, {"$push": {"my_ads": {"$each": [doc["ad_id"] for doc in created]}}})
+        await retain_objects(db, [key for doc in created for key in doc["image"]])
+        invalidate_feed_cache([category for doc in created for category in doc["category"]])
+        for doc in created:
+            variant_worker.enqueue(doc["ad_id"], doc["image"])
+
+    return [results[number] for number, _ in chunk]
+
+FEED_PROJECTION = {
+    "title": 1, "description": 1, "image": 1, "image_variants": 1, "views": 1, "favorited": 1, "owner": 1,
+    "ad_id": 1, "ad_loc": 1, "time_created": 1, "category": 1, "distance": 1
+}
+
+def and_query(*queries: dict) -> dict:
+    """Combine Mongo filters without letting keys of one overwrite another's."""
+    queries = [q for q in queries if q]
+    if not queries:
+        return {}
+    return queries[0] if len(queries) == 1 else {"$and": queries}
+
+def feed_sort_key(ad: dict, user_location: Optional[List[float]]) -> list:
+    """Position of an ad in feed order, used as the keyset for the next page."""
+    if user_location:
+        return [ad["distance"], ad["ad_id"]]
+    return [ad.get("time_created", ""), ad["ad_id"]]
+
+def feed_radii() -> List[float]:
+    """Search rings for the geo feed: MAX_DISTANCE_KM, then doubling up to FEED_MAX_RADIUS_KM."""
+    radii = [MAX_DISTANCE_KM]
+    while radii[-1] < FEED_MAX_RADIUS_KM:
+        radii.append(min(radii[-1] * 2, FEED_MAX_RADIUS_KM))
+    return radii
+
+def feed_pipeline(
+    query: dict,
+    user_location: Optional[List[float]],
+    limit: int,
+    offset: int = 0,
+    after: Optional[list] = None,
+    min_distance_km: float = 0,
+    max_distance_km: float = MAX_DISTANCE_KM
+) -> List[dict]:
+    """
+    Build the aggregation pipeline for one page of feed ads. With a known user location
+    the radius filter and the nearest-first sort run inside Mongo through $geoNear on the
+    2dsphere index, so a page is only short when there really are no more nearby ads.
+
+    Ads are ordered by (distance, ad_id) or (time_created DESC, ad_id DESC). Passing
+    the sort key of the last ad already shown as `after` resumes right behind it,
+    so a page costs the same no matter how deep the client has scrolled.
+
+    The geo search covers the ring between min_distance_km (exclusive) and
+    max_distance_km (inclusive), the time-ordered feed ignores both.
+    """
+    if user_location:
+        geo_near = geo_near_stage(user_location, max_distance_km, query)
+        pipeline = [geo_near]
+        if min_distance_km:
+            # minDistance lets the index skip everything inside the inner ring
+            geo_near["$geoNear"]["minDistance"] = min_distance_km * 1000
+            pipeline.append({"$match": {"distance": {"$gt": min_distance_km * 1000}}})
+        if after:
+            distance, ad_id = after
+            # ... and everything closer than the last ad shown
+            geo_near["$geoNear"]["minDistance"] = max(distance, min_distance_km * 1000)
+            pipeline.append({"$match": {"$or": [
+                {"distance": {"$gt": distance}},
+                {"distance": distance, "ad_id": {"$gt": ad_id}}
+            ]}})
+        pipeline.append({"$sort": {"distance": 1, "ad_id": 1}})
+    else:
+        if after:
+            time_created, ad_id = after
+            query = and_query(query, {"$or": [
+                {"time_created": {"$lt": time_created}},
+                {"time_created": time_created, "ad_id": {"$lt": ad_id}}
+            ]})
+        pipeline = [{"$match": query}, {"$sort": {"time_created": DESCENDING, "ad_id": DESCENDING}}]
+
+    if offset:
+        pipeline.append({"$skip": offset})
+    return pipeline + [{"$limit": limit}, {"$project": FEED_PROJECTION}]
+
+async def fetch_feed_ads(
+    db,
+    query: dict,
+    user_location: Optional[List[float]],
+    limit: int,
+    offset: int = 0,
+    after: Optional[list] = None,
+    min_distance_km: float = 0,
+    max_distance_km: float = MAX_DISTANCE_KM
+) -> List[dict]:
+    """Fetch one page of feed ads, see feed_pipeline for the ordering."""
+    if limit <= 0:
+        return []
+    pipeline = feed_pipeline(query, user_location, limit, offset, after, min_distance_km, max_distance_km)
+    return await db.ads.aggregate(pipeline).to_list(limit)
+
+async def fetch_personalised_ads(
+    db,
+    query: dict,
+    user_location: Optional[List[float]],
+    history_ids: List[str],
+    ranked_cats: List[int],
+    limit: int,
+    offset: int = 0,
+    start_phase: int = 0,
+    after: Optional[list] = None,
+    min_distance_km: float = 0,
+    max_distance_km: float = MAX_DISTANCE_KM
+) -> List[dict]:
+    """
+    Fetch one page of the history-personalised feed in a single aggregation.
+
+    Phase i holds ads of the i-th ranked category that are not in a higher ranked
+    one, the last phase holds the filler ads outside all of them. The phases never
+    overlap, so no ad is shown twice. Each phase is an index-backed sub-pipeline
+    capped at `offset + limit` and the phases are merged with $unionWith, then
+    ordered by phase and the regular feed order. The legacy offset is skipped once
+    on the merged result, as it counts ads across phases. Every returned ad
+    carries its "phase".
+    """
+    if limit <= 0:
+        return []
+
+    branches = []
+    for phase in range(start_phase, len(ranked_cats) + 1):
+        if phase < len(ranked_cats):
+            phase_query = {"category": {"$eq": ranked_cats[phase], "$nin": ranked_cats[:phase]}}
+        else:
+            phase_query = {"category": {"$nin": ranked_cats}}
+
+        branch = feed_pipeline(
+            and_query(query, phase_query, {"ad_id": {"$nin": history_ids}}),
+            user_location,
+            offset + limit,
+            after=after if phase == start_phase else None,
+            min_distance_km=min_distance_km,
+            max_distance_km=max_distance_km
+        )
+        branch.append({"$addFields": {"phase": phase}})
+        branches.append(branch)
+
+    pipeline = branches[0] + [{"$unionWith": {"coll": "ads", "pipeline": branch}} for branch in branches[1:]]
+    if user_location:
+        pipeline.append({"$sort": {"phase": 1, "distance": 1, "ad_id": 1}})
+    else:
+        pipeline.append({"$sort": {"phase": 1, "time_created": DESCENDING, "ad_id": DESCENDING}})
+    if offset:
+        pipeline.append({"$skip": offset})
+    pipeline.append({"$limit": limit})
+    return await db.ads.aggregate(pipeline).to_list(limit)
+
+async def get_feed_user(db, uid: str) -> Optional[dict]:
+    """
+    Load the feed-relevant parts of a user together with the categories of the
+    ads in their history, in one round trip.
+    """
+    users = await db.users.aggregate([
+        {"$match": {"uid": uid}},
+        {"$project": {"history": 1, "user_location": 1}},
+        {"$lookup": {"from": "ads", "localField": "history", "foreignField": "ad_id", "as": "history_ads"}},
+        {"$project": {"history": 1, "user_location": 1, "history_ads.category": 1}}
+    ]).to_list(1)
+    return users[0] if users else None
+
+def history_category_affinity(history_ads: List[dict]) -> Counter:
+    """Affinity of each category, i.e. how many history ads belong to it."""
+    return Counter(cat for ad in history_ads for cat in ad.get("category", []))
 
 @router.get("/", response_model=List[AdFeedResponse])
 async def get_ads(
+    response: Response,
     uid: Optional[str] = Depends(get_optional_uid),
     category: Optional[int] = None,
     min_price: Optional[int] = None,
     max_price: Optional[int] = None,
-    page: int = Query(..., ge=1),
+    page: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
     page_size: int = Query(15, ge=1, le=100),
     db=Depends(get_database)
 ):
-    query = {}
+    """
+    Feed of ads. Clients should page with the opaque token returned in the
+    X-Next-Cursor header; the header is absent on the last page. `page` is
+    still accepted for older clients and falls back to offset pagination.
+    For users with a location, X-Feed-Radius-Km reports the search radius used.
+    """
+    # Expired ads are never shown, even before the sweeper archived them
+    query = {"expires_at": live_ads_filter()}
     
     if category:
         query["category"] = category
     if min_price is not None and max_price is not None:
         query["price"] = {"$gte": min_price, "$lte": max_price}
     
-    # Calculate offset for pagination
-    offset = (page - 1) * page_size
+    # Offset pagination is only used when a legacy page number is given
+    offset = (page - 1) * page_size if page and not cursor else 0
+    position = decode_cursor(cursor) if cursor else {}
+    after = position.get("key")
+
+    # Anonymous pages only depend on the query, so they are served from cache
+    cache_key = None
+    if not uid:
+        price_range = (min_price, max_price) if "price" in query else None
+        cache_key = (category or None, price_range, offset, cursor, page_size)
+        cached = anonymous_feed_cache.get(cache_key)
+        if cached is not None:
+            results, next_cursor = cached
+            if next_cursor:
+                response.headers["X-Next-Cursor"] = next_cursor
+            return results
     
     ads_to_show = []
     user_location = None
     history_ids = []
+    ranked_cats = []
+    category_affinity = {}
+    next_position = None
 
     if uid:
-        user = await db.users.find_one({"uid": uid}, {"history": 1, "user_location": 1})
+        user = await get_feed_user(db, uid)
         history_ids = user.get("history", []) if user else []
         user_location = user.get("user_location") if user else None
 
         if history_ids:
-            history_ads = await db.ads.find(
-                {"ad_id": {"$in": history_ids}}, {"ad_id": 1, "category": 1}
-            ).to_list(100)
-
-            all_cats = [cat for ad in history_ads for cat in ad.get("category", [])]
-            ranked_cats = [cat for cat, _ in Counter(all_cats).most_common()]
-
-            for cat in ranked_cats:
-                ads = await db.ads.find(
-                    {
-                        "category": cat,
-                        "ad_id": {"$nin": history_ids},
-                        **query
-                    },
-                    {"title": 1, "description": 1, "image": 1, "views": 1,
-                     "favorited": 1, "owner": 1, "ad_id": 1, "ad_loc": 1, "time_created": 1, "category": 1}
-                ).skip(offset).limit(page_size).sort("time_created", DESCENDING).to_list(page_size)
-
-                for ad in ads:
-                    if "ad_id" not in ad:
-                        continue
-                    if user_location and "ad_loc" in ad and ad["ad_loc"]:
-                        try:
-                            dist = haversine(user_location[0], user_location[1], ad["ad_loc"][0], ad["ad_loc"][1])
-                            if dist <= MAX_DISTANCE_KM:
-                                ads_to_show.append(ad)
-                        except Exception:
-                            continue
-                    else:
-                        ads_to_show.append(ad)
-
-                if len(ads_to_show) >= page_size:
-                    break
-
-            # Show filler ads only if still needed
-            if len(ads_to_show) < page_size:
-                seen_ids = [ad["ad_id"] for ad in ads_to_show if "ad_id" in ad] + \
-                           [ad["ad_id"] for ad in history_ads if "ad_id" in ad]
-
-                filler_ads = await db.ads.find(
-                    {"ad_id": {"$nin": seen_ids}},
-                    {"title": 1, "description": 1, "image": 1, "views": 1,
-                     "favorited": 1, "owner": 1, "ad_id": 1, "ad_loc": 1, "time_created": 1, "category": 1}
-                ).skip(offset).limit(page_size).to_list(page_size)
-
-                for ad in filler_ads:
-                    if "ad_id" not in ad:
-                        continue
-                    if user_location and "ad_loc" in ad and ad["ad_loc"]:
-                        try:
-                            dist = haversine(user_location[0], user_location[1], ad["ad_loc"][0], ad["ad_loc"][1])
-                            if dist <= MAX_DISTANCE_KM:
-                                ads_to_show.append(ad)
-                                if len(ads_to_show) >= page_size:
-                                    break
-                        except Exception:
-                            continue
-                    else:
-                        ads_to_show.append(ad)
-                        if len(ads_to_show) >= page_size:
-                            break
+            category_affinity = history_category_affinity(user.get("history_ads", []))
+            # Keep the category ranking of the first page so later pages stay consistent
+            ranked_cats = position.get("cats")
+            if ranked_cats is None:
+                ranked_cats = [cat for cat, _ in category_affinity.most_common(FEED_MAX_RANKED_CATEGORIES)]
+            if position.get("phase", 0) > len(ranked_cats):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # In sparse areas the search widens ring by ring (15 km, 30 km, 60 km, ...) until
+    # the page is full. Legacy offset pages keep the fixed radius, an offset can't span rings.
+    radii = feed_radii() if user_location and not offset else [MAX_DISTANCE_KM]
+    if position.get("ring", 0) >= len(feed_radii()):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    start_ring = min(position.get("ring", 0), len(radii) - 1)
+    radius_km = radii[start_ring]
+
+    for ring in range(start_ring, len(radii)):
+        radius_km = radii[ring]
+        resume = ring == start_ring
+        ring_options = {
+            "offset": offset,
+            "after": after if resume else None,
+            "min_distance_km": radii[ring - 1] if ring else 0,
+            "max_distance_km": radius_km
+        }
 
-        else:
-            # No history
-            candidate_ads = await db.ads.find(
+        if history_ids:
+            ads = await fetch_personalised_ads(
+                db,
                 query,
-                {"title": 1, "description": 1, "image": 1, "views": 1,
-                "favorited": 1, "owner": 1, "ad_id": 1, "ad_loc": 1, "time_created": 1, "category": 1}
-            ).sort("time_created", DESCENDING).skip(offset).limit(page_size).to_list(page_size)
-
-            for ad in candidate_ads:
-                if "ad_id" not in ad:
-                    continue
-                if user_location and "ad_loc" in ad and ad["ad_loc"]:
-                    try:
-                        dist = haversine(user_location[0], user_location[1], ad["ad_loc"][0], ad["ad_loc"][1])
-                        if dist <= MAX_DISTANCE_KM:
-                            ads_to_show.append(ad)
-                            if len(ads_to_show) >= page_size:
-                                break
-                    except Exception:
-                        continue
-                else:
-                    ads_to_show.append(ad)
-                    if len(ads_to_show) >= page_size:
-                        break
-    else:
-        # Anonymous user
-        ads_to_show = await db.ads.find(
-            query,
-            {"title": 1, "description": 1, "image": 1, "views": 1,
-            "favorited": 1, "owner": 1, "ad_id": 1, "time_created": 1, "category": 1}
-        ).sort("time_created", DESCENDING).skip(offset).limit(page_size).to_list(page_size)
-
-    # Get owner usernames
-    owner_ids = list({ad["owner"] for ad in ads_to_show if "owner" in ad})
-    owners = await db.users.find({"uid": {"$in": owner_ids}}, {"uid": 1, "username": 1}).to_list(len(owner_ids))
-    owner_map = {u["uid"]: u["username"] for u in owners}
-
-    # Final formatting
+                user_location,
+                history_ids,
+                ranked_cats,
+                page_size - len(ads_to_show),
+                start_phase=position.get("phase", 0) if resume else 0,
+                **ring_options
+            )
+        else:
+            ads = await fetch_feed_ads(db, query, user_location, page_size - len(ads_to_show), **ring_options)
+        ads_to_show.extend(ads)
+
+        if len(ads_to_show) >= page_size:
+            last_ad = ads_to_show[-1]
+            next_position = {"ring": ring, "key": feed_sort_key(last_ad, user_location)}
+            if history_ids:
+                next_position.update(phase=last_ad["phase"], cats=ranked_cats)
+            break
+
+    next_cursor = encode_cursor(next_position) if next_position is not None else None
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if user_location:
+        # Lets clients show "showing ads within X km"
+        response.headers["X-Feed-Radius-Km"] = f"{radius_km:g}"
+
+    # Order the page by relevance, the cursor above keeps following the index order
+    ads_to_show = rank_ads(ads_to_show, user_location, category_affinity, radius_km=radius_km)
+
+    results = await format_feed_ads(db, ads_to_show[:page_size])
+    
+    if cache_key is not None:
+        anonymous_feed_cache.set(cache_key, (results, next_cursor))
+
+    return results
+
+@router.get("/search", response_model=List[AdFeedResponse])
+async def search_ads(
+    q: str = Query(..., min_length=1, max_length=100),
+    uid: Optional[str] = Depends(get_optional_uid),
+    category: Optional[int] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    radius_km: Optional[float] = Query(None, gt=0, le=FEED_MAX_RADIUS_KM),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(15, ge=1, le=100),
+    db=Depends(get_database)
+):
+    """
+    Keyword search over ad titles and descriptions, best matches first. Takes the
+    same filters as the feed; users with a location only get ads within radius_km
+    (MAX_DISTANCE_KM by default).
+    """
+    match = {"$text": {"$search": q}, "expires_at": live_ads_filter()}
+    if category:
+        match["category"] = category
+    if min_price is not None and max_price is not None:
+        match["price"] = {"$gte": min_price, "$lte": max_price}
+
+    user_location = None
+    if uid:
+        user = await db.users.find_one({"uid": uid}, {"user_location": 1})
+        user_location = user.get("user_location") if user else None
+    if user_location:
+        match["ad_geo"] = geo_within_filter(user_location, radius_km or MAX_DISTANCE_KM)
+
+    offset = (page - 1) * page_size
+    ads = await db.ads.aggregate([
+        {"$match": match},
+        {"$sort": {"score": {"$meta": "textScore"}, "ad_id": 1}},
+        {"$skip": offset},
+        {"$limit": page_size},
+        {"$project": FEED_PROJECTION}
+    ]).to_list(page_size)
+
+    if user_location:
+        for ad in ads:
+            if len(ad.get("ad_loc") or []) == 2:
+                # Same unit as the $geoNear distance of the feed
+                ad["distance"] = haversine(user_location[0], user_location[1], ad["ad_loc"][0], ad["ad_loc"][1]) * 1000
+
+    return await format_feed_ads(db, ads)
+
+@router.get("/facets", response_model=AdFacetsResponse)
+async def get_ad_facets(
+    uid: Optional[str] = Depends(get_optional_uid),
+    category: Optional[int] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    db=Depends(get_database)
+):
+    """
+    Counts for the filter chips of the feed: ads per sub-category, a price
+    histogram and, for users with a location, how many ads are within
+    MAX_DISTANCE_KM. Accepts the same filters as GET /ads/.
+    """
+    query = {"expires_at": live_ads_filter()}
+    if category:
+        query["category"] = category
+    if min_price is not None and max_price is not None:
+        query["price"] = {"$gte": min_price, "$lte": max_price}
+
+    user_location = None
+    if uid:
+        user = await db.users.find_one({"uid": uid}, {"user_location": 1})
+        user_location = user.get("user_location") if user else None
+
+    cache_key = (
+        category or None,
+        (min_price, max_price) if "price" in query else None,
+        tuple(user_location) if user_location else None
+    )
+    cached = facets_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    facets = {
+        "total": [{"$count": "count"}],
+        "categories": [
+            {"$unwind": "$category"},
+            {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}}
+        ],
+        "price_buckets": [
+            {"$match": {"price": {"$type": "number"}}},
+            {"$bucketAuto": {"groupBy": "$price", "buckets": FACETS_PRICE_BUCKETS}}
+        ]
+    }
+    if user_location:
+        facets["nearby"] = [
+            {"$match": {"ad_geo": geo_within_filter(user_location, MAX_DISTANCE_KM)}},
+            {"$count": "count"}
+        ]
+
+    result = (await db.ads.aggregate([{"$match": query}, {"$facet": facets}]).to_list(1))[0]
+
+    def count_of(facet: str) -> int:
+        return result[facet][0]["count"] if result.get(facet) else 0
+
+    response = AdFacetsResponse(
+        total=count_of("total"),
+        categories=[{"category": doc["_id"], "count": doc["count"]} for doc in result["categories"]],
+        price_buckets=[
+            {"min": doc["_id"]["min"], "max": doc["_id"]["max"], "count": doc["count"]}
+            for doc in result["price_buckets"]
+        ],
+        nearby=count_of("nearby") if user_location else None,
+        radius_km=MAX_DISTANCE_KM if user_location else None
+    )
+    facets_cache.set(cache_key, response)
+    return response
+
+def feed_image(ad: dict) -> Optional[str]:
+    """The small thumbnail of the first image, the original for ads uploaded before variants existed."""
+    variants = aligned_image_variants(ad)
+    if not variants:
+        return None
+    return variants[0].get("thumb") or variants[0]["original"]
+
+async def format_feed_ads(db, ads: List[dict]) -> List[dict]:
+    """Shape ads into AdFeedResponse rows, resolving owners through the owner cache."""
+    # Get owner usernames (served from the process-wide owner cache when warm)
+    owner_map = await get_owner_profiles(db, (ad["owner"] for ad in ads if "owner" in ad))
+
     results = []
-    for ad in ads_to_show[:page_size]:
+    for ad in ads:
         if "ad_id" not in ad:
             continue
         results.append({
             "title": ad["title"],
             "description": ad["description"],
-            "image": ad["image"][0] if ad.get("image") else None,
-            "views": ad.get("views", 0),
+            "image": feed_image(ad),
+            "views": ad.get("views", 0) + view_counter.unflushed(ad["ad_id"]),
             "favorited": ad.get("favorited", 0),
-            "username": owner_map.get(ad["owner"], "Unknown"),
+            "username": owner_map.get(ad["owner"], {}).get("username") or "Unknown",
             "ad_id": ad["ad_id"],
             "time_created": ad.get("time_created", ""),
-            "category": ad.get("category", [])
+            "category": ad.get("category", []),
+            # $geoNear reports metres, the API reports kilometres
+            "distance": round(ad["distance"] / 1000, 2) if "distance" in ad else None
         })
-    
     return results
 
 @router.get("/my-ads")
@@ -290,62 +722,80 @@ async def get_my_ads(
     # Calculate offset for pagination
     offset = (page - 1) * page_size
     
-    ads = await db.ads.find({"ad_id": {"$in": user["my_ads"]}}).skip(offset).limit(page_size).to_list(None)
+    ads = await db.ads.find({"ad_id": {"$in": user["my_ads"]}}, AD_READ_PROJECTION).skip(offset).limit(page_size).to_list(None)
     for ad in ads:
         ad.pop("_id", None)
+    view_counter.merge_into(ads)
 
     return [AdResponse(**ad) for ad in ads]
 
+async def load_ad_detail(db, ad_id: str) -> Optional[dict]:
+    ad = await db.ads.find_one({"ad_id": ad_id}, AD_READ_PROJECTION)
+    return AdResponse(**ad).dict() if ad else None
+
+@router.get("/archived", response_model=List[ArchivedAdResponse])
+async def get_archived_ads(
+    uid: str = Depends(verify_token),
+    reason: Optional[str] = Query(None),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100)
+):
+    """The user's sold, expired and deleted ads, most recently archived first."""
+    if reason is not None and reason not in ARCHIVE_REASONS:
+        raise HTTPException(status_code=400, detail=f"reason must be one of {', '.join(ARCHIVE_REASONS)}")
+    db = await get_database()
+
+    query = {"owner": uid}
+    if reason:
+        query["archive_reason"] = reason
+    offset = (page - 1) * page_size
+    ads = await db.ads_archive.find(query, {"_id": 0}).sort(
+        [("archived_at", DESCENDING), ("ad_id", DESCENDING)]
+    ).skip(offset).limit(page_size).to_list(page_size)
+    return [ArchivedAdResponse(**ad) for ad in ads]
+
 @router.get("/{ad_id}", response_model=AdResponse)
 async def get_ad(
     ad_id: str,
+    request: Request,
     uid: Optional[str] = Depends(get_optional_uid),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    ad = await db.ads.find_one({"ad_id": ad_id})
-    if not ad:
+    # Hot ads are served from the detail cache, concurrent misses share one read
+    payload = await ad_detail_cache.get_or_load(ad_id, lambda: load_ad_detail(db, ad_id))
+    if payload is None:
         raise HTTPException(status_code=404, detail="Ad not found")
+    ad = dict(payload)
 
     if uid:
-        # Check if user has already viewed the ad
-        already_viewed = uid in ad.get("viewed_by", [])
-
-        if not already_viewed:
-            # 1. Update the ad document: increment views, add to viewed_by
-            await db.ads.update_one(
-                {"ad_id": ad_id},
-                {
-                    "$inc": {"views": 1},
-                    "$addToSet": {"viewed_by": uid}
-                }
+        # Record the view, only the first one per user counts
+        first_view = await record_view(db, ad_id, uid)
+
+        if first_view:
+            # 1. Count the view, written to the ad in batches by the view counter
+            view_counter.add(ad_id)
+
+            # 2. Update the user's history (only if ad_id is not already there):
+            # prepend the new ad_id and truncate to HISTORY_MAX_LENGTH in one atomic update
+            await db.users.update_one(
+                {"uid": uid, "history": {"$ne": ad_id}},
+                {"$push": {"history": {"$each": [ad_id], "$position": 0, "$slice": HISTORY_MAX_LENGTH}}}
             )
 
-            # 2. Update the user's history (only if ad_id is not already there)
-            user = await db.users.find_one({"uid": uid}, {"history": 1})
-            if user is not None:
-                history = user.get("history", [])
-                if ad_id not in history:
-                    # Prepend the new ad_id, truncate to max 15
-                    new_history = [ad_id] + history[:14]
-                    await db.users.update_one(
-                        {"uid": uid},
-                        {"$set": {"history": new_history}}
-                    )
-
-            # Refresh ad to reflect updated data in response
-            ad["views"] = ad.get("views", 0) + 1
-            ad["viewed_by"] = ad.get("viewed_by", []) + [uid]
-
-    return AdResponse(**ad)
+    # Views that are still buffered, including the one just counted
+    view_counter.merge_into([ad])
+    # The payload is an AdResponse already, a client holding this version gets a 304
+    return etag_response(request, AD_DETAIL_CACHE_CONTROL, lambda: ad)
 
 @router.put("/{ad_id}")
 async def update_ad(
     ad_id: str,
     ad_update: AdUpdate = Depends(AdUpdate.as_form),
+    image: Optional[List[UploadFile]] = File(None),  # appended to the ad's images
     uid: str = Depends(verify_token)
 ):
     db = await get_database()
-    ad = await db.ads.find_one({"ad_id": ad_id})
+    ad = await db.ads.find_one({"ad_id": ad_id}, AD_READ_PROJECTION)
 
     if not ad:
         raise HTTPException(status_code=404, detail="Ad not found")
@@ -353,10 +803,16 @@ async def update_ad(
     if ad["owner"] != uid:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    update_data = ad_update.dict(exclude_unset=True)
+    # as_form passes every field, the ones not sent come through as None
+    update_data = {key: value for key, value in ad_update.dict(exclude_unset=True).items() if value is not None}
+    
+    if image and len(ad.get("image", [])) + len(image) > MAX_AD_IMAGES:
+        raise HTTPException(status_code=400, detail=f"An ad can have at most {MAX_AD_IMAGES} images")
+    if image:
+        check_image_size(image)
     
     # Check for "no changes detected"
-    unchanged = True
+    unchanged = not image
     for key, value in update_data.items():
         if ad.get(key) != value:
             unchanged = False
@@ -369,45 +825,116 @@ async def update_ad(
     if "category" in update_data:
         category_ids = update_data["category"]
         if category_ids:
-            # Check each category ID against sub_categories collection
-            # Each category ID should be a valid numb_id of a sub_category
-            valid_category_ids = []
-            for category_id in category_ids:
-                doc = await db.sub_categories.find_one({
-                    "numb_id": category_id
-                })
-                if not doc:
-                    raise HTTPException(status_code=400, detail=f"Category ID {category_id} is not valid.")
-                valid_category_ids.append(category_id)
-            
-            # All category IDs must be valid
-            if len(valid_category_ids) != len(category_ids):
-                raise HTTPException(status_code=400, detail="One or more category IDs are not valid.")
-            
-            # Get the parent_id for credit checking (all categories should belong to the same parent)
-            parent_ids = set()
-            for category_id in valid_category_ids:
-                doc = await db.sub_categories.find_one({
-                    "numb_id": category_id
-                })
-                if doc:
-                    parent_ids.add(doc["parent_id"])
-            
-            if len(parent_ids) > 1:
-                raise HTTPException(status_code=400, detail="Provided category IDs belong to multiple unrelated categories.")
+            # Each category ID should be a valid numb_id of a sub_category, all of them under the same parent
+            parent_id = resolve_parent_category(category_ids)
+            # The lifetime comes from the parent category, it may differ after a move
+            created = datetime.fromisoformat(ad["time_created"]) if ad.get("time_created") else datetime.utcnow()
+            update_data["expires_at"] = ad_expires_at(parent_id, created)
+    
+    # Keep the GeoJSON point used by the geo index in sync with ad_loc
+    if update_data.get("ad_loc"):
+        update_data["ad_geo"] = to_geo_point(update_data["ad_loc"])
+    
+    new_images = []
+    if image:
+        new_images = await upload_images_with_variants(image)
+        update_data["image"] = ad.get("image", []) + [keys["original"] for keys in new_images]
+        update_data["image_variants"] = aligned_image_variants(ad) + new_images
     
-    await db.ads.update_one({"ad_id": ad_id}, {"$set": update_data})
+    # Image lists are replaced as a whole, only on top of the ones we read above
+    query = {"ad_id": ad_id, "image": ad.get("image", [])} if new_images else {"ad_id": ad_id}
+    try:
+        result = await db.ads.update_one(query, {"$set": update_data})
+    except Exception:
+        await delete_images_with_variants(new_images)
+        raise
+    if result.matched_count == 0:
+        await delete_images_with_variants(new_images)
+        raise HTTPException(status_code=409, detail="Ad images changed meanwhile, please retry")
+    invalidate_ad_detail(ad_id)
+    invalidate_feed_cache(ad.get("category", []) + (update_data.get("category") or []))
     return {"message": "Ad updated successfully"}
 
+@router.put("/{ad_id}/images")
+async def update_ad_images(ad_id: str, request: AdImagesUpdate, uid: str = Depends(verify_token)):
+    """
+    Reorder or remove images of an ad without uploading them again. The first
+    image is the one shown in the feed. Removed images are deleted from storage.
+    """
+    db = await get_database()
+    ad = await db.ads.find_one({"ad_id": ad_id}, {"owner": 1, "image": 1, "image_variants": 1, "category": 1})
+
+    if not ad:
+        raise HTTPException(status_code=404, detail="Ad not found")
+
+    if ad["owner"] != uid:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    images = ad.get("image", [])
+    if not request.image:
+        raise HTTPException(status_code=400, detail="An ad needs at least one image")
+    if len(set(request.image)) != len(request.image):
+        raise HTTPException(status_code=400, detail="Duplicate image keys")
+    unknown = set(request.image) - set(images)
+    if unknown:
+        raise HTTPException(status_code=400, detail="Image does not belong to this ad")
+    if request.image == images:
+        raise HTTPException(status_code=400, detail="No changes detected")
+
+    variants = dict(zip(images, aligned_image_variants(ad)))
+    result = await db.ads.update_one(
+        {"ad_id": ad_id, "image": images},
+        {"$set": {"image": request.image, "image_variants": [variants[key] for key in request.image]}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=409, detail="Ad images changed meanwhile, please retry")
+
+    await delete_images_with_variants([keys for key, keys in variants.items() if key not in request.image])
+    invalidate_ad_detail(ad_id)
+    invalidate_feed_cache(ad.get("category", []))
+    return {"message": "Ad images updated successfully", "image": request.image}
+
 @router.delete("/{ad_id}")
 async def delete_ad(ad_id: str, uid: str = Depends(verify_token)):
     db = await get_database()
-    ad = await db.ads.find_one({"ad_id": ad_id})
+    ad = await db.ads.find_one({"ad_id": ad_id}, AD_READ_PROJECTION)
     if not ad or ad["owner"] != uid:
         raise HTTPException(status_code=403, detail="Not authorized or ad not found")
-    await db.ads.delete_one({"ad_id": ad_id})
-    await db.users.update_one(
-        {"uid": uid},
-        {"$pull": {"my_ads": ad_id}}
-    )
-    return {"message": "Ad deleted successfully"}
\ No newline at end of file
+    # Leaves a summary in ads_archive, references to the ad are cleaned up in the background
+    job_id = await archive_ads(db, [ad], "deleted")
+    if job_id is None:
+        # Removed by a concurrent request in the meantime
+        raise HTTPException(status_code=404, detail="Ad not found")
+    return {"message": "Ad deleted successfully", "cleanup_job_id": job_id}
+
+@router.post("/{ad_id}/sold")
+async def mark_ad_sold(ad_id: str, uid: str = Depends(verify_token)):
+    """Take a sold ad off the platform, it stays in the seller's archived ads."""
+    db = await get_database()
+    ad = await db.ads.find_one({"ad_id": ad_id}, AD_READ_PROJECTION)
+    if not ad or ad["owner"] != uid:
+        raise HTTPException(status_code=403, detail="Not authorized or ad not found")
+    job_id = await archive_ads(db, [ad], "sold")
+    if job_id is None:
+        raise HTTPException(status_code=404, detail="Ad not found")
+    return {"message": "Ad marked as sold", "cleanup_job_id": job_id}
+
+@router.get("/cleanup-jobs/{job_id}", response_model=CleanupJobResponse)
+async def get_cleanup_job(job_id: str, uid: str = Depends(verify_token)):
+    """Progress of the background cleanup started by deleting or selling an ad."""
+    db = await get_database()
+    job = await db.cleanup_jobs.find_one({"_id": job_id}, {"images": 0})
+    if not job or job.get("owner") != uid:
+        raise HTTPException(status_code=404, detail="Cleanup job not found")
+    return CleanupJobResponse(
+        job_id=job["_id"],
+        status=job["status"],
+        attempts=job.get("attempts", 0),
+        ad_ids=job["ad_ids"],
+        steps_done=[step for step in CLEANUP_STEPS if step in job["steps"]],
+        steps_total=len(CLEANUP_STEPS),
+        affected=job["steps"],
+        error=job.get("error"),
+        created_at=job["created_at"],
+        updated_at=job["updated_at"]
+    )
\ No newline at end of file
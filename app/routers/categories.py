@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
 from typing import List
 from utils.jwt import verify_token
 from database import get_database
 from typing import Union
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel
+from config import CATEGORIES_CACHE_CONTROL
+from utils.taxonomy import get_taxonomy
+from utils.etag import etag_response
 
 class CategoryResponse(BaseModel):
     numb_id: int
@@ -38,29 +41,31 @@ async def suggest_subcategories(
 
     return sorted(results)
 
+# Both lists are served from the in-memory taxonomy, the ETag is its version so an
+# unchanged list is answered with 304 without building the body
+
 @router.get("/categories", response_model=List[CategoryResponse])
-async def get_all_categories(
-    db: AsyncIOMotorDatabase = Depends(get_database)
-):
-    cursor = db.categories.find({}, {"numb_id": 1, "name": 1, "_id": 0})
-    categories = []
-    
-    async for doc in cursor:
-        categories.append(CategoryResponse(**doc))
-    
-    return categories
+async def get_all_categories(request: Request):
+    taxonomy = get_taxonomy()
+    return etag_response(
+        request,
+        CATEGORIES_CACHE_CONTROL,
+        lambda: [{"numb_id": c.numb_id, "name": c.name} for c in taxonomy.categories.values()],
+        etag=f'"categories-{taxonomy.version}"'
+    )
 
 @router.get("/sub-categories", response_model=List[SubCategoryResponse])
-async def get_all_sub_categories(
-    db: AsyncIOMotorDatabase = Depends(get_database)
-):
-    cursor = db.sub_categories.find({}, {"numb_id": 1, "name": 1, "parent_id": 1, "_id": 0})
-    sub_categories = []
-    
-    async for doc in cursor:
-        sub_categories.append(SubCategoryResponse(**doc))
-    
-    return sub_categories
+async def get_all_sub_categories(request: Request):
+    taxonomy = get_taxonomy()
+    return etag_response(
+        request,
+        CATEGORIES_CACHE_CONTROL,
+        lambda: [
+            {"numb_id": s.numb_id, "name": s.name, "parent_id": s.parent_id}
+            for s in taxonomy.sub_categories.values()
+        ],
+        etag=f'"sub-categories-{taxonomy.version}"'
+    )
 
 @router.get("/{category_id}")
 async def get_category_details(
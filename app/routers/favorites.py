@@ -1,6 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from models.ad import AdResponse
 from utils.jwt import verify_token
+from utils.views import AD_READ_PROJECTION
+from utils.view_counter import view_counter
+from routers.ads import invalidate_ad_detail
 from database import get_database
 from typing import List
 
@@ -11,7 +14,7 @@ async def add_to_favorites(ad_id: str, uid: str = Depends(verify_token)):
     db = await get_database()
 
     # Check if ad exists
-    ad = await db.ads.find_one({"ad_id": ad_id})
+    ad = await db.ads.find_one({"ad_id": ad_id}, {"_id": 1})
     if not ad:
         raise HTTPException(status_code=44, detail="Ad not found")
 
@@ -35,6 +38,7 @@ async def add_to_favorites(ad_id: str, uid: str = Depends(verify_token)):
         {"ad_id": ad_id},
         {"$inc": {"favorited": 1}}
     )
+    invalidate_ad_detail(ad_id)
 
     return {"message": "Added to favorites"}
 
@@ -54,6 +58,7 @@ async def remove_from_favorites(ad_id: str, uid: str = Depends(verify_token)):
             {"ad_id": ad_id},
             {"$inc": {"favorited": -1}}
         )
+        invalidate_ad_detail(ad_id)
         return {"message": "Removed from favorites"}
     
     raise HTTPException(status_code=404, detail="Ad not in favorites")
@@ -76,8 +81,9 @@ async def get_favorites(
         # Calculate offset for pagination
         offset = (page - 1) * page_size
         
-        ads_cursor = db.ads.find({"ad_id": {"$in": user["favorites"]}}).skip(offset).limit(page_size)
+        ads_cursor = db.ads.find({"ad_id": {"$in": user["favorites"]}}, AD_READ_PROJECTION).skip(offset).limit(page_size)
         ads = await ads_cursor.to_list(None)
+        view_counter.merge_into(ads)
         favorite_ads = [AdResponse(**ad) for ad in ads]
     
     return favorite_ads
@@ -0,0 +1,111 @@
+from fastapi import APIRouter, HTTPException, Depends
+from pydantic import BaseModel
+from typing import Literal, Optional
+from config import PRESIGNED_UPLOAD_EXPIRE_SECONDS, MAX_IMAGE_UPLOAD_BYTES, ALLOWED_IMAGE_CONTENT_TYPES, MAX_AD_IMAGES
+from utils.jwt import verify_token
+from utils.s3 import s3_client, upload_prefix
+from utils.owners import invalidate_owner
+from utils.images import aligned_image_variants
+from utils.objects import retain_objects, release_objects
+from utils.variant_worker import variant_worker
+from routers.ads import invalidate_feed_cache, invalidate_ad_detail
+from database import get_database
+import uuid
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+class PresignRequest(BaseModel):
+    content_type: str
+
+class PresignResponse(BaseModel):
+    key: str
+    upload_url: str
+    method: str = "PUT"
+    headers: dict
+    expires_in: int
+    max_bytes: int
+
+class FinalizeRequest(BaseModel):
+    key: str
+    target: Literal["ad", "profile"]
+    ad_id: Optional[str] = None
+
+@router.post("/presign", response_model=PresignResponse)
+async def presign_upload(request: PresignRequest, uid: str = Depends(verify_token)):
+    """
+    Issue a presigned PUT URL so the client uploads an image straight to storage.
+    Afterwards the key is attached to an ad or the profile with POST /uploads/finalize.
+    """
+    extension = ALLOWED_IMAGE_CONTENT_TYPES.get(request.content_type)
+    if not extension:
+        raise HTTPException(status_code=400, detail="Unsupported image type")
+
+    key = f"{upload_prefix(uid)}{uuid.uuid4()}.{extension}"
+    upload_url = await s3_client.generate_presigned_upload(key, request.content_type, PRESIGNED_UPLOAD_EXPIRE_SECONDS)
+
+    return PresignResponse(
+        key=key,
+        upload_url=upload_url,
+        headers={"Content-Type": request.content_type},
+        expires_in=PRESIGNED_UPLOAD_EXPIRE_SECONDS,
+        max_bytes=MAX_IMAGE_UPLOAD_BYTES
+    )
+
+@router.post("/finalize")
+async def finalize_upload(request: FinalizeRequest, uid: str = Depends(verify_token)):
+    """Attach a directly uploaded image to one of the user's ads or to their profile."""
+    if not request.key.startswith(upload_prefix(uid)):
+        raise HTTPException(status_code=403, detail="Upload key does not belong to this user")
+
+    db = await get_database()
+
+    ad = None
+    if request.target == "ad":
+        if not request.ad_id:
+            raise HTTPException(status_code=400, detail="ad_id is required to attach an image to an ad")
+        ad = await db.ads.find_one(
+            {"ad_id": request.ad_id}, {"owner": 1, "image": 1, "image_variants": 1, "category": 1}
+        )
+        if not ad or ad["owner"] != uid:
+            raise HTTPException(status_code=403, detail="Not authorized or ad not found")
+        if request.key in ad.get("image", []):
+            raise HTTPException(status_code=400, detail="Image is already attached to this ad")
+        if len(ad.get("image", [])) >= MAX_AD_IMAGES:
+            raise HTTPException(status_code=400, detail=f"An ad can have at most {MAX_AD_IMAGES} images")
+
+    size = await s3_client.get_object_size(request.key)
+    if size is None:
+        raise HTTPException(status_code=404, detail="Uploaded image not found")
+    if size == 0 or size > MAX_IMAGE_UPLOAD_BYTES:
+        # The presigned URL stays valid after finalize, the key may already be attached
+        # elsewhere and overwritten since. Only never-finalized uploads are removed.
+        if not await db.s3_objects.find_one({"_id": request.key}, {"_id": 1}):
+            await s3_client.delete_file(request.key)
+        raise HTTPException(status_code=400, detail="Uploaded image is empty or too large")
+
+    await retain_objects(db, [request.key])
+
+    if request.target == "ad":
+        images = ad.get("image", [])
+        # Only apply on top of the image list we validated against
+        result = await db.ads.update_one(
+            {"ad_id": request.ad_id, "image": images},
+            {"$set": {
+                "image": images + [request.key],
+                "image_variants": aligned_image_variants(ad) + [{"original": request.key}]
+            }}
+        )
+        if result.matched_count == 0:
+            await release_objects(db, [request.key])
+            raise HTTPException(status_code=409, detail="Ad images changed meanwhile, please retry")
+        invalidate_ad_detail(request.ad_id)
+        invalidate_feed_cache(ad.get("category", []))
+        # Feed thumbnail and detail size are rendered in the background
+        variant_worker.enqueue(request.ad_id, [request.key])
+        return {"message": "Image attached to ad", "key": request.key}
+
+    user = await db.users.find_one_and_update({"uid": uid}, {"$set": {"profile_img": request.key}}, {"profile_img": 1})
+    invalidate_owner(uid)
+    if user and user.get("profile_img"):
+        await release_objects(db, [user["profile_img"]])
+    return {"message": "Profile image updated", "key": request.key}
@@ -1,7 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, Request
 from models.user import UserResponse, UserUpdate, FollowRequest, FollowersRequest, FollowersCountResponse, FollowerResponse, FollowersResponse, FollowingRequest, FollowingCountResponse, FollowingResponse, FollowingListResponse
 from utils.jwt import verify_token
 from utils.s3 import s3_client
+from utils.owners import invalidate_owner
+from utils.objects import retain_objects, release_objects
+from utils.images import check_image_size
+from utils.etag import etag_response
+from config import USER_ME_CACHE_CONTROL, USER_DELETE_BATCH_SIZE
+from utils.archive import archive_ads
+from utils.views import AD_READ_PROJECTION
 from database import get_database
 from utils.email import send_email
 from utils.otp import generate_otp, store_email_otp
@@ -12,12 +19,13 @@ from typing import Optional, List
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(uid: str = Depends(verify_token)):
+async def get_current_user(request: Request, uid: str = Depends(verify_token)):
     db = await get_database()
     user = await db.users.find_one({"uid": uid})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return UserResponse(**user)
+    # Users carry no version stamp, the ETag is the hash of the response body
+    return etag_response(request, USER_ME_CACHE_CONTROL, lambda: UserResponse(**user).dict())
 
 @router.put("/me")
 async def update_user_profile(
@@ -69,46 +77,69 @@ async def update_user_profile(
 
     # Handle image upload separately
     if profile_image:
-        image_url = await s3_client.upload_file(profile_image)
-        if existing_user.get("profile_img") != image_url:
-            update_data["profile_img"] = image_url
+        check_image_size([profile_image])
+        image_key = await s3_client.content_key(profile_image)
+        if existing_user.get("profile_img") != image_key:
+            # Uploads are content-addressed and may be shared, the old image goes once unreferenced.
+            # Retained before uploading, a deletion of the same image in progress is waited for.
+            await retain_objects(db, [image_key])
+            try:
+                await s3_client.upload_file(profile_image, image_key)
+            except Exception:
+                await release_objects(db, [image_key])
+                raise
+            update_data["profile_img"] = image_key
 
     if not update_data:
         raise HTTPException(status_code=400, detail="No changes detected")
 
-    # Handle email verification if email is updated
-    if email_updated:
-        # Generate OTP
-        otp = generate_otp()
-        
-        # Store OTP with email
-        email = update_fields["email"]
-        store_email_otp(email, otp)
-        
-        # Send email with OTP
-        html_content = EMAIL_VERIFICATION_TEMPLATE.replace("{{otp_code}}", otp)
-        subject = "Email Verification OTP"
-        email_sent = send_email(email, subject, html_content)
-        
-        if not email_sent:
-            raise HTTPException(status_code=500, detail="Failed to send verification email")
-        
+    try:
+        # Handle email verification if email is updated
+        if email_updated:
+            # Generate OTP
+            otp = generate_otp()
+            
+            # Store OTP with email
+            email = update_fields["email"]
+            store_email_otp(email, otp)
+            
+            # Send email with OTP
+            html_content = EMAIL_VERIFICATION_TEMPLATE.replace("{{otp_code}}", otp)
+            subject = "Email Verification OTP"
+            email_sent = send_email(email, subject, html_content)
+            
+            if not email_sent:
+                raise HTTPException(status_code=500, detail="Failed to send verification email")
+
         # Apply updates (email_verified is already set to False in update_fields)
         await user_collection.update_one({"uid": uid}, {"$set": update_data})
-        
-        return {"message": "Verification Code has been sent to your email", "updated_fields": list(update_data.keys())}
+    except Exception:
+        # The new image was retained above but never attached
+        if "profile_img" in update_data:
+            await release_objects(db, [update_data["profile_img"]])
+        raise
 
-    # Apply updates for non-email changes
-    await user_collection.update_one({"uid": uid}, {"$set": update_data})
+    # Feed pages show the owner's username and image from a cache
+    if "username" in update_data or "profile_img" in update_data:
+        invalidate_owner(uid)
+    if "profile_img" in update_data and existing_user.get("profile_img"):
+        await release_objects(db, [existing_user["profile_img"]])
 
+    if email_updated:
+        return {"message": "Verification Code has been sent to your email", "updated_fields": list(update_data.keys())}
     return {"message": "Profile updated successfully", "updated_fields": list(update_data.keys())}
 
 @router.delete("/me")
 async def delete_user(uid: str = Depends(verify_token)):
     db = await get_database()
     
-    # Delete user's ads
-    await db.ads.delete_many({"owner": uid})
+    # Archive the user's ads like any other deleted ad, so their images, views,
+    # favorites, history entries and chatrooms are cleaned up in the background
+    while True:
+        ads = await db.ads.find({"owner": uid}, AD_READ_PROJECTION).limit(USER_DELETE_BATCH_SIZE).to_list(USER_DELETE_BATCH_SIZE)
+        if not ads:
+            break
+        await archive_ads(db, ads, "deleted")
     
     # Delete user's chatrooms and messages
     chatrooms = await db.chatrooms.find({"participants": uid}).to_list(None)
@@ -117,7 +148,10 @@ async def delete_user(uid: str = Depends(verify_token)):
     await db.chatrooms.delete_many({"participants": uid})
     
     # Delete user
-    await db.users.delete_one({"uid": uid})
+    user = await db.users.find_one_and_delete({"uid": uid}, {"profile_img": 1})
+    invalidate_owner(uid)
+    if user and user.get("profile_img"):
+        await release_objects(db, [user["profile_img"]])
     
     return {"message": "User and all related data deleted successfully"}
 
@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime
+from typing import Callable, List, Optional
+from pymongo import ReplaceOne, UpdateOne
+from utils.images import aligned_image_variants
+from utils.objects import retain_objects
+from utils.cleanup_jobs import enqueue_ad_cleanup
+from utils.views import AD_READ_PROJECTION
+
+# Why an ad left the ads collection
+ARCHIVE_REASONS = ("sold", "expired", "deleted")
+
+# Fields kept in ads_archive, enough for seller history and analytics
+ARCHIVE_SUMMARY_FIELDS = ("ad_id", "owner", "title", "price", "category", "views", "favorited", "time_created", "expires_at")
+
+_archived_listeners: List[Callable[[List[dict]], None]] = []
+
+def on_archived(listener: Callable[[List[dict]], None]):
+    """Call listener(ads) after ads were archived, e.g. to drop cached copies."""
+    _archived_listeners.append(listener)
+
+def archive_summary(ad: dict, reason: str, now: datetime) -> dict:
+    summary = {field: ad.get(field) for field in ARCHIVE_SUMMARY_FIELDS}
+    # Keeps the ad's _id, archiving the same ad again (e.g. a retried batch) is a no-op
+    summary.update({"_id": ad["_id"], "archive_reason": reason, "archived_at": now, "image": None})
+    variants = aligned_image_variants(ad)
+    if variants and reason != "deleted":
+        summary["image"] = variants[0].get("thumb") or variants[0]["original"]
+    return summary
+
+async def archive_ads(db, ads: List[dict], reason: str) -> Optional[str]:
+    """
+    Move ads out of the hot ads collection into ads_archive as slim summaries and
+    drop them from their owners' my_ads. Everything else referencing them (views,
+    favorites, history, chatrooms, images except the thumbnail kept for sold and
+    expired ads) is cleaned up by a background job, whose id is returned.
+
+    The summaries are written before the ads are deleted, so an ad never leaves
+    the ads collection without one, and a failed call can simply be retried. Only
+    the ads this call actually deleted are released: concurrent archives of the
+    same ad (delete and sold, a double click, sweepers in several processes)
+    release its images once. Returns None if none of the ads were left to archive.
+    """
+    if not ads:
+        return None
+    now = datetime.utcnow()
+    summaries = [archive_summary(ad, reason, now) for ad in ads]
+    # Never overwrites: the summary of whichever call deletes the ad is fixed up below
+    result = await db.ads_archive.bulk_write(
+        [UpdateOne({"_id": summary["_id"]}, {"$setOnInsert": summary}, upsert=True) for summary in summaries],
+        ordered=False
+    )
+    inserted = {summaries[index]["_id"] for index in result.upserted_ids}
+
+    deleted = await asyncio.gather(
+        *(db.ads.find_one_and_delete({"_id": ad["_id"]}, projection=AD_READ_PROJECTION) for ad in ads)
+    )
+    ads = [ad for ad in deleted if ad is not None]
+    if not ads:
+        return None
+    summaries = [archive_summary(ad, reason, now) for ad in ads]
+    written = {summary["_id"]: summary for summary in summaries if summary["_id"] in inserted}
+    fixes = [
+        ReplaceOne({"_id": summary["_id"]}, summary)
+        for summary, ad in zip(summaries, ads)
+        if written.get(ad["_id"]) != summary
+    ]
+    if fixes:
+        # Written by an earlier attempt or a concurrent call, or the ad changed since it was read
+        await db.ads_archive.bulk_write(fixes, ordered=False)
+
+    # Retained before the job releases the ads' own references, so the kept thumbnail
+    # survives. A legacy key has no counter yet, the ad's own reference is counted too.
+    await retain_objects(db, [summary["image"] for summary in summaries if summary["image"]], legacy_refs=1)
+    owners = list({ad["owner"] for ad in ads})
+    job_id = await enqueue_ad_cleanup(db, ads, owners[0] if len(owners) == 1 else None)
+
+    ad_ids = [ad["ad_id"] for ad in ads]
+    await db.users.update_many({"uid": {"$in": owners}}, {"$pull": {"my_ads": {"$in": ad_ids}}})
+
+    for listener in _archived_listeners:
+        listener(ads)
+    return job_id
\ No newline at end of file
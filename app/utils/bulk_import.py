@@ -0,0 +1,94 @@
+import asyncio
+import csv
+import io
+import json
+from typing import IO, Dict, Iterable, Iterator, List, Tuple, Union
+from fastapi import UploadFile
+from pydantic import ValidationError
+from models.ad import AdCreate
+from utils.geo import parse_location
+from config import MAX_IMAGE_UPLOAD_BYTES
+from utils.s3 import s3_client
+
+# Columns of a CSV import. Lists are "|"-separated, ad_loc is "lat,lng" (quoted).
+IMPORT_CSV_COLUMNS = ("title", "description", "price", "category", "ad_loc", "image")
+
+def import_format(file: UploadFile) -> str:
+    filename = (file.filename or "").lower()
+    if filename.endswith(".csv") or (file.content_type or "").startswith("text/csv"):
+        return "csv"
+    return "ndjson"
+
+def iter_import_rows(fileobj: IO[bytes], fmt: str) -> Iterator[Tuple[int, Union[dict, str]]]:
+    """
+    Parse an uploaded import file row by row, never holding the whole file in memory.
+    Yields (row number, row dict), or (row number, error message) for unparsable rows.
+    """
+    fileobj.seek(0)
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            for number, row in enumerate(csv.DictReader(text), start=1):
+                yield number, csv_row(row)
+            return
+
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                yield number, "Invalid JSON"
+                continue
+            yield number, row if isinstance(row, dict) else "Row must be a JSON object"
+    finally:
+        # Leave the upload itself open, FastAPI closes it
+        text.detach()
+
+def csv_row(row: dict) -> dict:
+    def split(value: str) -> List[str]:
+        return [part.strip() for part in (value or "").split("|") if part.strip()]
+
+    return {
+        "title": row.get("title"),
+        "description": row.get("description"),
+        "price": row.get("price"),
+        "category": split(row.get("category")),
+        "ad_loc": row.get("ad_loc"),
+        "image": split(row.get("image"))
+    }
+
+def parse_import_row(row: dict) -> Tuple[AdCreate, List[str]]:
+    """Validate one import row, returns the ad and its image keys or raises ValueError."""
+    ad_loc = parse_location(row.get("ad_loc"))
+
+    try:
+        ad_create = AdCreate(
+            title=row.get("title"),
+            description=row.get("description"),
+            price=row.get("price"),
+            category=row.get("category") or [],
+            ad_loc=ad_loc
+        )
+    except ValidationError as e:
+        error = e.errors()[0]
+        raise ValueError(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}")
+
+    images = row.get("image") or []
+    if isinstance(images, str):
+        images = [images]
+    if not all(isinstance(key, str) for key in images):
+        raise ValueError("image must be a list of upload keys")
+    return ad_create, images
+
+async def upload_errors(keys: Iterable[str]) -> Dict[str, str]:
+    """Look up the uploaded images concurrently, returns an error for each missing or oversized one."""
+    keys = list(keys)
+    sizes = await asyncio.gather(*(s3_client.get_object_size(key) for key in keys))
+    errors = {}
+    for key, size in zip(keys, sizes):
+        if size is None:
+            errors[key] = f"Uploaded image {key} not found"
+        elif size == 0 or size > MAX_IMAGE_UPLOAD_BYTES:
+            errors[key] = f"Uploaded image {key} is empty or too large"
+    return errors
\ No newline at end of file
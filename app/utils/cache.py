@@ -0,0 +1,106 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+# Every named cache registers itself here so its counters can be inspected
+CACHES: Dict[str, "TTLCache"] = {}
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries expire after a fixed time-to-live.
+    Used from the event loop only, so no locking is needed.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Loads in progress for get_or_load, one per key
+        self._loading: Dict[Hashable, asyncio.Task] = {}
+        CACHES[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def peek(self, key: Hashable) -> Any:
+        """The cached value if present, without touching LRU order or counters."""
+        entry = self._data.get(key)
+        return entry[1] if entry is not None else None
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached value, or load it with loader and cache it. Concurrent
+        misses of one key share a single load. None results are not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, loader))
+            self._loading[key] = task
+        # A cancelled caller must not cancel the load the others are waiting on
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        self.loads += 1
+        try:
+            value = await loader()
+            # Invalidated while loading: the value may be stale, hand it out but don't keep it
+            if value is not None and self._loading.get(key) is asyncio.current_task():
+                self.set(key, value)
+            return value
+        finally:
+            if self._loading.get(key) is asyncio.current_task():
+                del self._loading[key]
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+        self._loading.pop(key, None)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches predicate, returns how many were dropped."""
+        stale = [key for key in self._data if predicate(key)]
+        for key in stale:
+            del self._data[key]
+        for key in [key for key in self._loading if predicate(key)]:
+            del self._loading[key]
+        return len(stale)
+
+    def clear(self):
+        self._data.clear()
+        self._loading.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None
+        }
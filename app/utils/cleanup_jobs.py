@@ -0,0 +1,211 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import ASCENDING, ReturnDocument
+from config import CLEANUP_JOB_POLL_SECONDS, CLEANUP_JOB_LEASE_SECONDS
+from config import CLEANUP_JOB_RETRY_BASE_SECONDS, CLEANUP_JOB_RETRY_MAX_SECONDS
+from utils.images import aligned_image_variants
+from utils.objects import release_object
+
+# Steps of an ad cleanup job, run in this order. Each one is recorded in the job
+# when it finishes, a job picked up again after a crash skips the finished ones.
+CLEANUP_STEPS = ("ad_views", "favorites", "history", "chatrooms", "images")
+
+def image_references(ad: dict) -> List[Dict]:
+    """One entry per stored object the ad holds a reference to, unique within the ad."""
+    return [
+        {"ad_id": ad["ad_id"], "slot": slot, "key": key}
+        for slot, keys in enumerate(aligned_image_variants(ad))
+        for key in keys.values()
+    ]
+
+async def enqueue_ad_cleanup(db, ads: List[dict], owner: Optional[str]) -> str:
+    """
+    Persist a cleanup job for ads that were just removed from the ads collection and
+    wake the worker. owner is the user allowed to follow the job (None for system jobs).
+    """
+    now = datetime.utcnow()
+    job_id = str(uuid.uuid4())
+    await db.cleanup_jobs.insert_one({
+        "_id": job_id,
+        "ad_ids": [ad["ad_id"] for ad in ads],
+        "owner": owner,
+        # Image references still to release, each is removed from the job as it is released
+        "images": [ref for ad in ads for ref in image_references(ad)],
+        "image_count": 0,
+        "status": "queued",
+        "steps": {},
+        "attempts": 0,
+        "run_after": now,
+        "created_at": now,
+        "updated_at": now
+    })
+    cleanup_worker.wake()
+    return job_id
+
+async def initialize_cleanup_jobs_collection(db):
+    await db.cleanup_jobs.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+    print("[INIT] Created index on status, created_at for cleanup_jobs collection.")
+
+class CleanupWorker:
+    """
+    Runs queued ad cleanup jobs in the background: deletes view records, pulls the
+    ads from every user's favorites and history with update_many, closes chatrooms
+    about them and releases their images. Jobs are claimed with a lease that is
+    renewed while they run, so with several app processes each job runs once, and
+    a job whose process died is picked up again once the lease ran out. A failed
+    job is retried with exponential backoff. Every step can safely run again.
+    """
+
+    def __init__(self, poll_seconds: int, lease_seconds: int):
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._db = None
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self._db.cleanup_jobs.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_after": {"$not": {"$gt": now}}},
+                {"status": "running", "lease_until": {"$lt": now}}
+            ]},
+            {"$set": {
+                "status": "running",
+                "lease_until": now + timedelta(seconds=self.lease_seconds),
+                "updated_at": now
+            }},
+            sort=[("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _run_step(self, step: str, job: dict) -> int:
+        db = self._db
+        ad_ids = job["ad_ids"]
+        if step == "ad_views":
+            return (await db.ad_views.delete_many({"ad_id": {"$in": ad_ids}})).deleted_count
+        if step == "favorites":
+            result = await db.users.update_many(
+                {"favorites": {"$in": ad_ids}}, {"$pull": {"favorites": {"$in": ad_ids}}}
+            )
+            return result.modified_count
+        if step == "history":
+            result = await db.users.update_many(
+                {"history": {"$in": ad_ids}}, {"$pull": {"history": {"$in": ad_ids}}}
+            )
+            return result.modified_count
+        if step == "chatrooms":
+            result = await db.chatrooms.update_many(
+                {"ad_id": {"$in": ad_ids}, "status": {"$ne": "closed"}},
+                {"$set": {"status": "closed", "closed_at": datetime.utcnow().isoformat()}}
+            )
+            return result.modified_count
+        if step == "images":
+            released = await asyncio.gather(*(self._release_image(job["_id"], ref) for ref in job["images"]))
+            return sum(released)
+        raise ValueError(f"Unknown cleanup step {step}")
+
+    async def _release_image(self, job_id: str, ref: dict) -> int:
+        # Pulling the reference from the job claims it, only whoever pulled it releases
+        # the object. A rerun after a crash never releases a reference twice, at worst
+        # one that was claimed right before the crash is never released.
+        result = await self._db.cleanup_jobs.update_one(
+            {"_id": job_id, "images": ref},
+            {"$pull": {"images": ref}, "$inc": {"image_count": 1}}
+        )
+        if not result.modified_count:
+            return 0
+        await release_object(self._db, ref["key"])
+        return 1
+
+    async def _renew_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self._db.cleanup_jobs.update_one(
+                {"_id": job_id, "status": "running"},
+                {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+            )
+
+    async def _retry_later(self, job: dict, error: Exception):
+        attempts = job.get("attempts", 0) + 1
+        delay = min(CLEANUP_JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), CLEANUP_JOB_RETRY_MAX_SECONDS)
+        now = datetime.utcnow()
+        await self._db.cleanup_jobs.update_one(
+            {"_id": job["_id"]},
+            {
+                "$set": {
+                    "status": "queued",
+                    "attempts": attempts,
+                    "error": str(error),
+                    "run_after": now + timedelta(seconds=delay),
+                    "updated_at": now
+                },
+                "$unset": {"lease_until": ""}
+            }
+        )
+
+    async def run_job(self, job: dict):
+        heartbeat = asyncio.create_task(self._renew_lease(job["_id"]))
+        try:
+            for step in CLEANUP_STEPS:
+                if step in job["steps"]:
+                    continue
+                affected = await self._run_step(step, job)
+                if step == "images":
+                    # Include references released by earlier attempts
+                    affected += job.get("image_count", 0)
+                # $max: a rerun that found less left to do doesn't lower the reported count
+                await self._db.cleanup_jobs.update_one(
+                    {"_id": job["_id"]},
+                    {"$max": {f"steps.{step}": affected}, "$set": {"updated_at": datetime.utcnow()}}
+                )
+            await self._db.cleanup_jobs.update_one(
+                {"_id": job["_id"]},
+                {"$set": {"status": "done", "updated_at": datetime.utcnow()}, "$unset": {"lease_until": "", "error": ""}}
+            )
+        finally:
+            heartbeat.cancel()
+
+    async def _run(self):
+        while True:
+            try:
+                job = await self._claim()
+                while job is not None:
+                    try:
+                        await self.run_job(job)
+                    except Exception as e:
+                        print(f"[ERROR] Cleanup job {job['_id']} failed, retrying later: {e}")
+                        await self._retry_later(job, e)
+                    job = await self._claim()
+            except Exception as e:
+                print(f"[ERROR] Claiming cleanup jobs failed: {e}")
+
+            # Jobs enqueued here wake the worker, the poll picks up other processes' jobs
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self, db):
+        self._db = db
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            print("[INIT] Started ad cleanup worker.")
+
+    async def stop(self):
+        # An interrupted job keeps its lease and is resumed after it runs out
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+cleanup_worker = CleanupWorker(CLEANUP_JOB_POLL_SECONDS, CLEANUP_JOB_LEASE_SECONDS)
@@ -1,4 +1,6 @@
+from collections import Counter
 from datetime import datetime
+from typing import List, Optional
 
 async def sync_credits(db, uid: str):
     now = datetime.utcnow().isoformat()
@@ -28,3 +30,63 @@ async def sync_credits(db, uid: str):
                 "created": now,
                 "updated": now
             })
+
+# Pools are tried in this order when an ad is posted
+CREDIT_POOLS = ("free_credits", "paid_credits")
+
+async def consume_credit(db, uid: str, category: int) -> Optional[str]:
+    """
+    Atomically take one credit for a category, free credits first. Each pool is a
+    single conditional find_one_and_update, so concurrent posts can never spend
+    the same credit twice. Returns the pool the credit came from, or None.
+    """
+    now = datetime.utcnow()
+    for pool in CREDIT_POOLS:
+        doc = await db[pool].find_one_and_update(
+            {"UID": uid, "category": category, "credits": {"$gt": 0}},
+            {"$inc": {"credits": -1}, "$set": {"updated": now}},
+            projection={"_id": 1}
+        )
+        if doc:
+            return pool
+    return None
+
+async def refund_credit(db, uid: str, category: int, pool: str):
+    """Give back a credit taken by consume_credit when the ad could not be created."""
+    await db[pool].update_one(
+        {"UID": uid, "category": category},
+        {"$inc": {"credits": 1}, "$set": {"updated": datetime.utcnow()}}
+    )
+
+async def reserve_credits(db, uid: str, category: int, count: int) -> List[str]:
+    """
+    Take up to count credits for a category in one go, free credits first. Each
+    pool is a compare-and-set on its current balance, retried if a concurrent post
+    changed it. Returns the pool of every credit taken, fewer than count if the
+    balance ran out.
+    """
+    now = datetime.utcnow()
+    pools = []
+    for pool in CREDIT_POOLS:
+        while len(pools) < count:
+            doc = await db[pool].find_one({"UID": uid, "category": category}, {"credits": 1})
+            available = doc.get("credits", 0) if doc else 0
+            if available <= 0:
+                break
+            take = min(available, count - len(pools))
+            result = await db[pool].update_one(
+                {"_id": doc["_id"], "credits": available},
+                {"$inc": {"credits": -take}, "$set": {"updated": now}}
+            )
+            if result.modified_count:
+                pools.extend([pool] * take)
+                break
+    return pools
+
+async def refund_credits(db, uid: str, category: int, pools: List[str]):
+    """Give back credits taken by reserve_credits that were not used."""
+    for pool, count in Counter(pools).items():
+        await db[pool].update_one(
+            {"UID": uid, "category": category},
+            {"$inc": {"credits": count}, "$set": {"updated": datetime.utcnow()}}
+        )
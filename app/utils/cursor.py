@@ -0,0 +1,47 @@
+import base64
+import json
+from numbers import Real
+from fastapi import HTTPException
+from config import FEED_MAX_RANKED_CATEGORIES
+
+def encode_cursor(data: dict) -> str:
+    """Serialise a pagination position into an opaque, URL-safe token."""
+    raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str) -> dict:
+    """
+    Parse a token produced by encode_cursor, rejecting anything malformed with a 400.
+    Tokens come from the client, every field is checked before it reaches a query.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(data, dict):
+            raise ValueError("cursor must be an object")
+        validate_position(data)
+        return data
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def validate_position(data: dict):
+    """Check the fields of a feed position, see get_ads. Raises ValueError."""
+    for field in ("ring", "phase"):
+        if field in data and not (_is_int(data[field]) and data[field] >= 0):
+            raise ValueError(f"{field} must be a non-negative integer")
+    if "key" in data:
+        # (distance, ad_id) or (time_created, ad_id), plain values only, never operators
+        key = data["key"]
+        if not (
+            isinstance(key, list) and len(key) == 2
+            and (isinstance(key[0], str) or (isinstance(key[0], Real) and not isinstance(key[0], bool)))
+            and isinstance(key[1], str)
+        ):
+            raise ValueError("key must be a sort value and an ad id")
+    if "cats" in data:
+        cats = data["cats"]
+        if not (isinstance(cats, list) and len(cats) <= FEED_MAX_RANKED_CATEGORIES and all(_is_int(c) for c in cats)):
+            raise ValueError(f"cats must be at most {FEED_MAX_RANKED_CATEGORIES} category ids")
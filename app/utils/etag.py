@@ -0,0 +1,37 @@
+import hashlib
+import json
+from typing import Any, Callable, Optional
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the client's If-None-Match already names this ETag (weak or strong)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def etag_response(
+    request: Request,
+    cache_control: str,
+    build: Callable[[], Any],
+    etag: Optional[str] = None
+) -> Response:
+    """
+    JSON response with a strong ETag, or an empty 304 when the client has it already.
+    With a known etag (e.g. a version stamp) the 304 is answered before build() runs,
+    otherwise the ETag is the hash of the serialised body.
+    """
+    headers = {"Cache-Control": cache_control}
+    if etag is not None and etag_matches(request, etag):
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    body = json.dumps(jsonable_encoder(build()), separators=(",", ":")).encode()
+    etag = etag or f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers["ETag"] = etag
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo import ASCENDING
+from config import EXPIRY_SWEEP_INTERVAL_SECONDS, EXPIRY_SWEEP_BATCH_SIZE
+from utils.taxonomy import get_taxonomy
+from utils.views import AD_READ_PROJECTION
+from utils.archive import archive_ads
+
+def ad_expires_at(parent_id: int, created: datetime) -> Optional[datetime]:
+    """When an ad of this parent category expires, from the category's int_date (days)."""
+    category = get_taxonomy().categories.get(parent_id)
+    if not category or not category.int_date:
+        return None
+    return created + timedelta(days=category.int_date)
+
+def live_ads_filter() -> dict:
+    """Condition on expires_at that only matches ads that have not expired yet."""
+    # Also matches ads without expires_at, i.e. categories without a lifetime
+    return {"$not": {"$lte": datetime.utcnow()}}
+
+class ExpirySweeper:
+    """
+    Background task that archives expired ads every EXPIRY_SWEEP_INTERVAL_SECONDS,
+    EXPIRY_SWEEP_BATCH_SIZE ads per round trip (see utils.archive). Feed queries
+    filter with live_ads_filter, so ads are hidden as soon as they expire either way.
+    """
+
+    def __init__(self, interval_seconds: int, batch_size: int):
+        self.interval = interval_seconds
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self._db = None
+
+    async def sweep(self) -> int:
+        """Archive every ad that has expired by now, returns how many were moved."""
+        db = self._db
+        now = datetime.utcnow()
+        total = 0
+        while True:
+            ads = await db.ads.find(
+                {"expires_at": {"$lte": now}}, AD_READ_PROJECTION
+            ).sort("expires_at", ASCENDING).limit(self.batch_size).to_list(self.batch_size)
+            if not ads:
+                break
+
+            await archive_ads(db, ads, "expired")
+            total += len(ads)
+            if len(ads) < self.batch_size:
+                break
+        return total
+
+    async def _run(self):
+        while True:
+            try:
+                archived = await self.sweep()
+                if archived:
+                    print(f"[INIT] Archived {archived} expired ads.")
+            except Exception as e:
+                print(f"[ERROR] Expired ad sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self, db):
+        self._db = db
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            print("[INIT] Started expired ad sweeper.")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+expiry_sweeper = ExpirySweeper(EXPIRY_SWEEP_INTERVAL_SECONDS, EXPIRY_SWEEP_BATCH_SIZE)
@@ -0,0 +1,64 @@
+from math import radians, cos, sin, asin, sqrt
+from typing import List, Optional, Union
+
+def haversine(lat1, lon1, lat2, lon2):
+    R = 6371  # Radius of Earth in km
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
+    c = 2 * asin(sqrt(a))
+    return R * c
+
+def parse_location(value: Union[str, list]) -> List[float]:
+    """
+    Parse a "lat,lng" string (or a [lat, lng] list) into [latitude, longitude],
+    raising ValueError if it is malformed or out of range.
+    """
+    if isinstance(value, str):
+        try:
+            value = [float(x.strip()) for x in value.split(",")]
+        except ValueError:
+            raise ValueError("Invalid location format. Must be two comma-separated numbers")
+    if not isinstance(value, list) or len(value) != 2:
+        raise ValueError("Location must contain exactly two numbers: latitude and longitude")
+    try:
+        lat, lng = float(value[0]), float(value[1])
+    except (TypeError, ValueError):
+        raise ValueError("Invalid location format. Must be two comma-separated numbers")
+    # Also rejects NaN, which compares false either way
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError("Latitude must be between -90 and 90 and longitude between -180 and 180")
+    return [lat, lng]
+
+def to_geo_point(location: Optional[List[float]]) -> Optional[dict]:
+    """
+    Convert a [latitude, longitude] pair (the format of ad_loc and user_location)
+    into a GeoJSON point. GeoJSON stores coordinates as [longitude, latitude].
+    """
+    if not location or len(location) != 2:
+        return None
+    return {"type": "Point", "coordinates": [float(location[1]), float(location[0])]}
+
+def geo_near_stage(location: List[float], max_distance_km: float, query: Optional[dict] = None) -> dict:
+    """
+    Build a $geoNear stage that filters ads to the given radius around location
+    and sorts them nearest first. The distance (in metres) is written to "distance".
+    """
+    return {
+        "$geoNear": {
+            "near": to_geo_point(location),
+            "key": "ad_geo",
+            "distanceField": "distance",
+            "maxDistance": max_distance_km * 1000,
+            "query": query or {},
+            "spherical": True
+        }
+    }
+
+def geo_within_filter(location: List[float], radius_km: float) -> dict:
+    """
+    Match ads within radius_km of location. Unlike $geoNear this can be combined
+    with other operators that must come first, such as $text.
+    """
+    point = to_geo_point(location)
+    return {"$geoWithin": {"$centerSphere": [point["coordinates"], radius_km / 6371]}}
@@ -0,0 +1,176 @@
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+from fastapi import HTTPException, UploadFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+from config import IMAGE_VARIANT_SIZES, IMAGE_WEBP_QUALITY, IMAGE_PROCESS_WORKERS, AD_IMAGE_UPLOAD_CONCURRENCY
+from config import MAX_IMAGE_UPLOAD_BYTES
+from utils.s3 import s3_client
+from utils.objects import retain_objects, release_objects
+from database import get_database
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Pool for CPU-bound image work, created on first use so idle workers cost nothing."""
+    global _process_pool
+    if _process_pool is None:
+        # spawn: never fork a process that already runs event loop and boto3 threads
+        _process_pool = ProcessPoolExecutor(
+            max_workers=IMAGE_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True)
+        _process_pool = None
+
+def render_variants(data: bytes) -> Dict[str, bytes]:
+    """
+    Decode an uploaded image once and encode every size in IMAGE_VARIANT_SIZES as
+    WebP, bounded by that many pixels on the longest side. Runs in a worker process.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        # Phone photos are often stored sideways with an EXIF rotation flag
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        variants = {}
+        for name, size in IMAGE_VARIANT_SIZES.items():
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            variant.save(buffer, "WEBP", quality=IMAGE_WEBP_QUALITY, method=4)
+            variants[name] = buffer.getvalue()
+        return variants
+
+def image_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413, detail=f"Images can be at most {MAX_IMAGE_UPLOAD_BYTES // (1024 * 1024)} MB"
+    )
+
+def check_image_size(files: List[UploadFile]):
+    """Reject uploads over MAX_IMAGE_UPLOAD_BYTES before anything is read or charged."""
+    if any(file.size is not None and file.size > MAX_IMAGE_UPLOAD_BYTES for file in files):
+        raise image_too_large()
+
+async def upload_image_with_variants(file: UploadFile) -> Dict[str, str]:
+    """
+    Upload an image together with its resized WebP variants. Returns the S3 keys
+    as {"original": ..., "thumb": ..., "detail": ...}, each holding one reference
+    (see utils.objects). Keys are derived from the image content, a photo that was
+    uploaded before is neither rendered nor uploaded again. On failure nothing is
+    left behind.
+    """
+    check_image_size([file])
+    original_key = await s3_client.content_key(file)
+    stem = original_key.rsplit(".", 1)[0]
+    keys = {"original": original_key}
+    keys.update({name: f"{stem}_{name}.webp" for name in IMAGE_VARIANT_SIZES})
+
+    # Retained before checking what is stored: if the last reference to this image
+    # is being released right now, this waits for the deletion and uploads it again
+    db = await get_database()
+    await retain_objects(db, keys.values())
+    try:
+        exists = await asyncio.gather(*(s3_client.object_exists(key) for key in keys.values()))
+        if all(exists):
+            # Validated and rendered when it was first uploaded
+            return keys
+
+        await file.seek(0)
+        # Bounded even if the client sent no size
+        data = await file.read(MAX_IMAGE_UPLOAD_BYTES + 1)
+        if len(data) > MAX_IMAGE_UPLOAD_BYTES:
+            raise image_too_large()
+
+        loop = asyncio.get_running_loop()
+        try:
+            rendered = await loop.run_in_executor(get_process_pool(), render_variants, data)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+            raise HTTPException(status_code=400, detail="Invalid image file")
+
+        missing = {name for name, stored in zip(keys, exists) if not stored}
+        uploads = [s3_client.upload_file(file, original_key)] if "original" in missing else []
+        uploads += [
+            s3_client.upload_bytes(body, keys[name], "image/webp")
+            for name, body in rendered.items() if name in missing
+        ]
+        results = await asyncio.gather(*uploads, return_exceptions=True)
+
+        failures = [result for result in results if isinstance(result, Exception)]
+        if failures:
+            raise failures[0]
+    except BaseException:
+        await release_objects(db, keys.values())
+        raise
+
+    return keys
+
+async def render_stored_variants(db, key: str) -> Dict[str, str]:
+    """
+    Render and store the WebP variants of an image that is already in storage, e.g.
+    a presigned upload. Returns {"thumb": ..., "detail": ...}, each holding one reference.
+    """
+    data = await s3_client.download_bytes(key)
+    loop = asyncio.get_running_loop()
+    rendered = await loop.run_in_executor(get_process_pool(), render_variants, data)
+
+    stem = key.rsplit(".", 1)[0]
+    keys = {name: f"{stem}_{name}.webp" for name in rendered}
+    await retain_objects(db, keys.values())
+    results = await asyncio.gather(
+        *(s3_client.upload_bytes(rendered[name], variant_key, "image/webp") for name, variant_key in keys.items()),
+        return_exceptions=True
+    )
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        await release_objects(db, keys.values())
+        raise failures[0]
+    return keys
+
+async def delete_image_with_variants(keys: Dict[str, str]):
+    """Release an image and its variants, deleting whatever is no longer referenced."""
+    await release_objects(await get_database(), keys.values())
+
+async def upload_images_with_variants(files: List[UploadFile]) -> List[Dict[str, str]]:
+    """
+    Upload several images concurrently, at most AD_IMAGE_UPLOAD_CONCURRENCY at a time.
+    Returns their keys in the order of files. If any image fails, the ones that
+    made it are deleted again and the first error is raised.
+    """
+    slots = asyncio.Semaphore(AD_IMAGE_UPLOAD_CONCURRENCY)
+
+    async def upload(file: UploadFile) -> Dict[str, str]:
+        async with slots:
+            return await upload_image_with_variants(file)
+
+    results = await asyncio.gather(*(upload(file) for file in files), return_exceptions=True)
+
+    failures = [result for result in results if isinstance(result, BaseException)]
+    if failures:
+        await delete_images_with_variants([result for result in results if not isinstance(result, BaseException)])
+        raise failures[0]
+
+    return results
+
+async def delete_images_with_variants(images: List[Dict[str, str]]):
+    await asyncio.gather(*(delete_image_with_variants(keys) for keys in images))
+
+def aligned_image_variants(ad: dict) -> List[Dict[str, str]]:
+    """
+    The variants of each image of an ad, index-aligned with ad["image"]. Images
+    without generated variants (older ads, direct uploads) only have an "original".
+    """
+    images = ad.get("image") or []
+    variants = ad.get("image_variants") or []
+    return [
+        variants[i] if i < len(variants) and variants[i].get("original") == image else {"original": image}
+        for i, image in enumerate(images)
+    ]
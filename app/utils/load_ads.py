@@ -0,0 +1,98 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import GEOSPHERE, ASCENDING, DESCENDING, TEXT
+from pymongo.errors import OperationFailure
+from config import EXPIRY_BACKFILL_GRACE_DAYS
+from utils.taxonomy import get_taxonomy
+
+async def initialize_ads_collection(db: AsyncIOMotorDatabase):
+    """
+    Backfill the GeoJSON location of existing ads and create the indexes used by the feed.
+    """
+    # Ads created before ad_geo existed only have ad_loc ([lat, lng]), derive the point from it.
+    # Out of range locations are left without one, the 2dsphere index would reject them.
+    result = await db.ads.update_many(
+        {
+            "ad_geo": {"$exists": False},
+            "ad_loc.0": {"$gte": -90, "$lte": 90},
+            "ad_loc.1": {"$gte": -180, "$lte": 180}
+        },
+        [{
+            "$set": {
+                "ad_geo": {
+                    "type": "Point",
+                    "coordinates": [
+                        {"$arrayElemAt": ["$ad_loc", 1]},
+                        {"$arrayElemAt": ["$ad_loc", 0]}
+                    ]
+                }
+            }
+        }]
+    )
+    print(f"[INIT] Backfilled ad_geo on {result.modified_count} ads.")
+
+    try:
+        await db.ads.create_index([("ad_geo", GEOSPHERE)])
+        print("[INIT] Created 2dsphere index on ad_geo for ads collection.")
+    except OperationFailure as e:
+        print(f"[ERROR] Error creating 2dsphere index on ads collection: {e}")
+
+    # Keyset pagination of the feed walks ads by (time_created, ad_id)
+    await db.ads.create_index([("time_created", DESCENDING), ("ad_id", DESCENDING)])
+    print("[INIT] Created index on time_created, ad_id for ads collection.")
+
+    # Keyword search over titles and descriptions, title matches weigh more
+    await db.ads.create_index(
+        [("title", TEXT), ("description", TEXT)],
+        weights={"title": 3, "description": 1},
+        name="ads_text_search"
+    )
+    print("[INIT] Created text index on title, description for ads collection.")
+
+    # Ads created before expiry existed get expires_at from their parent category's int_date,
+    # but never sooner than EXPIRY_BACKFILL_GRACE_DAYS from now: old ads don't all vanish at
+    # once on the first boot, their owners get time to renew or mark them sold
+    grace_until = {"$add": ["$$NOW", EXPIRY_BACKFILL_GRACE_DAYS * 24 * 60 * 60 * 1000]}
+    taxonomy = get_taxonomy()
+    stamped = 0
+    for category in taxonomy.categories.values():
+        if not category.int_date:
+            continue
+        sub_ids = [s.numb_id for s in taxonomy.sub_categories.values() if s.parent_id == category.numb_id]
+        created = {"$dateFromString": {"dateString": "$time_created", "onError": "$$NOW", "onNull": "$$NOW"}}
+        result = await db.ads.update_many(
+            {"expires_at": {"$exists": False}, "category": {"$in": sub_ids}},
+            [{"$set": {"expires_at": {"$max": [
+                {"$add": [created, category.int_date * 24 * 60 * 60 * 1000]}, grace_until
+            ]}}}]
+        )
+        stamped += result.modified_count
+    print(f"[INIT] Stamped expires_at on {stamped} ads.")
+
+    # The expiry sweeper scans ads by expires_at
+    await db.ads.create_index([("expires_at", ASCENDING)])
+    print("[INIT] Created index on expires_at for ads collection.")
+
+    # Archived ads are read per owner, most recent first (see utils.archive)
+    await db.ads_archive.create_index([("owner", ASCENDING), ("archived_at", DESCENDING)])
+    print("[INIT] Created index on owner, archived_at for ads_archive collection.")
+
+    # One document per unique viewer of an ad, see utils.views
+    await db.ad_views.create_index([("ad_id", ASCENDING), ("uid", ASCENDING)], unique=True)
+    print("[INIT] Created unique index on ad_id, uid for ad_views collection.")
+
+    # Unique viewers used to be stored in the ad itself, move them over and drop the arrays
+    migrated = await db.ads.count_documents({"viewed_by": {"$exists": True}})
+    if migrated:
+        await db.ads.aggregate([
+            {"$match": {"viewed_by.0": {"$exists": True}}},
+            {"$unwind": "$viewed_by"},
+            {"$project": {"_id": 0, "ad_id": 1, "uid": "$viewed_by"}},
+            {"$merge": {
+                "into": "ad_views",
+                "on": ["ad_id", "uid"],
+                "whenMatched": "keepExisting",
+                "whenNotMatched": "insert"
+            }}
+        ]).to_list(None)
+        await db.ads.update_many({"viewed_by": {"$exists": True}}, {"$unset": {"viewed_by": ""}})
+        print(f"[INIT] Moved viewed_by of {migrated} ads to ad_views.")
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from typing import Iterable
+from pymongo import ReturnDocument, UpdateOne
+from config import OBJECT_DELETE_WAIT_SECONDS, OBJECT_DELETE_POLL_MS
+from utils.s3 import s3_client
+
+# Stored objects are content-addressed and can be shared by several ads and
+# profiles. s3_objects holds {_id: key, refs: n}, an object is only deleted
+# from storage once nothing references it any more. While the last release
+# deletes it, the counter is marked {deleting: true}: a reference taken in the
+# meantime waits for the deletion to finish and then uploads the object again.
+
+async def retain_objects(db, keys: Iterable[str], legacy_refs: int = 0):
+    """
+    Add one reference to each key (a key listed twice gets two). legacy_refs is the
+    number of references already held on keys uploaded before objects were tracked,
+    which have no counter yet: a caller retaining a key of an ad it is about to
+    release passes 1, so that release doesn't take the new counter back to zero.
+
+    Returns once none of the keys is being deleted any more. A caller that holds
+    the content must then check that the object exists and upload it if not.
+    """
+    keys = list(keys)
+    if legacy_refs:
+        await asyncio.gather(*(_retain_object(db, key, legacy_refs) for key in keys))
+    elif keys:
+        requests = [UpdateOne({"_id": key}, {"$inc": {"refs": 1}}, upsert=True) for key in keys]
+        await db.s3_objects.bulk_write(requests, ordered=False)
+    if keys:
+        await _wait_for_deletions(db, keys)
+
+async def _wait_for_deletions(db, keys: list):
+    deadline = time.monotonic() + OBJECT_DELETE_WAIT_SECONDS
+    while await db.s3_objects.count_documents({"_id": {"$in": keys}, "deleting": True}, limit=1):
+        if time.monotonic() > deadline:
+            # The process deleting them died, the uploader puts back whatever is gone
+            await db.s3_objects.update_many({"_id": {"$in": keys}, "deleting": True}, {"$unset": {"deleting": ""}})
+            return
+        await asyncio.sleep(OBJECT_DELETE_POLL_MS / 1000)
+
+async def _retain_object(db, key: str, legacy_refs: int):
+    while True:
+        result = await db.s3_objects.update_one({"_id": key}, {"$inc": {"refs": 1}})
+        if result.matched_count:
+            return
+        result = await db.s3_objects.update_one(
+            {"_id": key}, {"$setOnInsert": {"refs": legacy_refs + 1}}, upsert=True
+        )
+        if result.upserted_id is not None:
+            return
+        # Someone else created the counter in between, count our reference on it
+
+async def release_object(db, key: str):
+    """Drop one reference to key and delete the object when it was the last one."""
+    counter = await db.s3_objects.find_one_and_update(
+        {"_id": key}, {"$inc": {"refs": -1}}, return_document=ReturnDocument.AFTER
+    )
+    if counter is None:
+        # Uploaded before objects were tracked, those keys were unique per upload
+        await s3_client.delete_file(key)
+        return
+    if counter["refs"] > 0:
+        return
+    # Only delete if nobody took a new reference in the meantime, and only once
+    marked = await db.s3_objects.update_one(
+        {"_id": key, "refs": {"$lte": 0}, "deleting": {"$ne": True}}, {"$set": {"deleting": True}}
+    )
+    if not marked.modified_count:
+        return
+    try:
+        await s3_client.delete_file(key)
+    finally:
+        # The counter stays if the object was retained again while it was deleted,
+        # its new owner is waiting for the mark to go and uploads it again
+        result = await db.s3_objects.delete_one({"_id": key, "refs": {"$lte": 0}, "deleting": True})
+        if not result.deleted_count:
+            await db.s3_objects.update_one({"_id": key}, {"$unset": {"deleting": ""}})
+
+async def release_objects(db, keys: Iterable[str]):
+    await asyncio.gather(*(release_object(db, key) for key in keys))
@@ -0,0 +1,38 @@
+from typing import Dict, Iterable
+from config import OWNER_CACHE_TTL_SECONDS, OWNER_CACHE_MAX_ENTRIES
+from utils.cache import TTLCache
+
+# uid -> {"username", "profile_img"} of ad owners, shared by every request of the process
+owner_cache = TTLCache("owners", OWNER_CACHE_MAX_ENTRIES, OWNER_CACHE_TTL_SECONDS)
+
+async def get_owner_profiles(db, uids: Iterable[str]) -> Dict[str, dict]:
+    """
+    Resolve uids to their public profile. Cached owners cost nothing, all misses
+    are loaded with a single query. Unknown uids are cached too (with a None
+    username) so deleted sellers don't trigger a lookup on every page.
+    """
+    profiles = {}
+    missing = []
+    for uid in set(uids):
+        profile = owner_cache.get(uid)
+        if profile is None:
+            missing.append(uid)
+        else:
+            profiles[uid] = profile
+
+    if missing:
+        users = await db.users.find(
+            {"uid": {"$in": missing}}, {"uid": 1, "username": 1, "profile_img": 1, "_id": 0}
+        ).to_list(len(missing))
+        found = {u["uid"]: u for u in users}
+        for uid in missing:
+            user = found.get(uid, {})
+            profile = {"username": user.get("username"), "profile_img": user.get("profile_img")}
+            owner_cache.set(uid, profile)
+            profiles[uid] = profile
+
+    return profiles
+
+def invalidate_owner(uid: str):
+    """Forget a cached owner after their username or profile image changed."""
+    owner_cache.pop(uid)
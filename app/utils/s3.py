@@ -1,47 +1,145 @@
+import asyncio
+import hashlib
 import boto3
-import uuid
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional
 from fastapi import UploadFile
 from config import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, IMAGES_BUCKET_NAME
+from config import S3_MAX_WORKERS, S3_MAX_CONCURRENT_UPLOADS, S3_MULTIPART_THRESHOLD_MB, S3_MULTIPART_CHUNK_MB
 from botocore.client import Config
+from boto3.s3.transfer import TransferConfig
+
+MB = 1024 * 1024
 
 class S3Client:
     def __init__(self):
         self.bucket_name = IMAGES_BUCKET_NAME
         self.endpoint_url = f"https://{AWS_REGION}.contabostorage.com"
-        
+
         self.s3_client = boto3.client(
             's3',
             aws_access_key_id=AWS_ACCESS_KEY_ID,
             aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
             region_name=AWS_REGION,
             endpoint_url=self.endpoint_url,
-            config=Config(signature_version="s3v4")
+            config=Config(signature_version="s3v4", max_pool_connections=S3_MAX_WORKERS * 2)
+        )
+
+        # boto3 is blocking, its calls run on this bounded pool so the event loop stays free
+        self._executor = ThreadPoolExecutor(max_workers=S3_MAX_WORKERS, thread_name_prefix="s3")
+        # Caps how many uploads are in flight at once across the whole worker
+        self._upload_slots = asyncio.Semaphore(S3_MAX_CONCURRENT_UPLOADS)
+        # Bodies above the threshold are streamed up in parts instead of one PUT
+        self._transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD_MB * MB,
+            multipart_chunksize=S3_MULTIPART_CHUNK_MB * MB,
+            max_concurrency=4
         )
 
-    async def upload_file(self, file: UploadFile) -> str:
-        file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
-        filename = f"{uuid.uuid4()}.{file_extension}"
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def content_key(self, file: UploadFile) -> str:
+        """
+        Content-addressed key of an upload: the sha256 of its bytes plus the file
+        extension, so the same photo always maps to the same object.
+        """
+        file_extension = file.filename.split('.')[-1] if file.filename and '.' in file.filename else 'jpg'
+        digest = await self._run(_sha256_fileobj, file.file)
+        return f"{digest}.{file_extension.lower()}"
+
+    async def upload_file(self, file: UploadFile, filename: Optional[str] = None) -> str:
+        filename = filename or await self.content_key(file)
 
         try:
+            # Same content, same key: an object that is already stored is not uploaded again
+            if await self.object_exists(filename):
+                return filename
+
             await file.seek(0)
-            contents = await file.read()
 
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=filename,
-                Body=contents,
-                ContentType=file.content_type or 'image/jpeg'
-            )
+            # Stream straight from the spooled upload, the body is never read into memory
+            async with self._upload_slots:
+                await self._run(
+                    self.s3_client.upload_fileobj,
+                    file.file,
+                    self.bucket_name,
+                    filename,
+                    ExtraArgs={"ContentType": file.content_type or 'image/jpeg'},
+                    Config=self._transfer_config
+                )
 
             return f"{filename}"
         except Exception as e:
             print(f"Error uploading file: {e}")
             raise e
 
-    def delete_file(self, filename: str):
+    async def upload_bytes(self, data: bytes, filename: str, content_type: str) -> str:
         try:
-            self.s3_client.delete_object(Bucket=self.bucket_name, Key=filename)
+            async with self._upload_slots:
+                await self._run(
+                    self.s3_client.put_object,
+                    Bucket=self.bucket_name,
+                    Key=filename,
+                    Body=data,
+                    ContentType=content_type
+                )
+            return filename
+        except Exception as e:
+            print(f"Error uploading file: {e}")
+            raise e
+
+    async def delete_file(self, filename: str):
+        try:
+            await self._run(self.s3_client.delete_object, Bucket=self.bucket_name, Key=filename)
         except Exception as e:
             print(f"Error deleting file: {e}")
 
+    async def generate_presigned_upload(self, filename: str, content_type: str, expires_in: int) -> str:
+        """URL the client can PUT the object to directly. The PUT must send the same Content-Type."""
+        return await self._run(
+            self.s3_client.generate_presigned_url,
+            "put_object",
+            Params={"Bucket": self.bucket_name, "Key": filename, "ContentType": content_type},
+            ExpiresIn=expires_in
+        )
+
+    async def download_bytes(self, filename: str) -> bytes:
+        """Whole body of a stored object, only for objects known to be small (see MAX_IMAGE_UPLOAD_BYTES)."""
+        def read():
+            return self.s3_client.get_object(Bucket=self.bucket_name, Key=filename)["Body"].read()
+        return await self._run(read)
+
+    async def get_object_size(self, filename: str) -> Optional[int]:
+        """Size in bytes of a stored object, None if it does not exist."""
+        try:
+            head = await self._run(self.s3_client.head_object, Bucket=self.bucket_name, Key=filename)
+            return head["ContentLength"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    async def object_exists(self, filename: str) -> bool:
+        return await self.get_object_size(filename) is not None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+def upload_prefix(uid: str) -> str:
+    # Presigned keys issued to a user live under their own prefix, only those can be attached
+    return f"uploads/{uid}/"
+
+def _sha256_fileobj(fileobj) -> str:
+    # Hashes in chunks, spooled uploads may be on disk and are never read into memory at once
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(MB), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
 s3_client = S3Client()
@@ -0,0 +1,144 @@
+import numpy as np
+from datetime import datetime
+from itertools import chain
+from typing import Callable, Dict, List, Optional
+from config import FEED_SCORE_WEIGHTS, FEED_RECENCY_HALF_LIFE_HOURS, MAX_DISTANCE_KM
+
+EARTH_RADIUS_KM = 6371
+
+class CandidateSet:
+    """
+    Column-oriented view of a batch of feed candidates. Every field the scorers
+    need is extracted once into a NumPy array so scoring is pure array math.
+    """
+
+    def __init__(
+        self,
+        ads: List[dict],
+        user_location: Optional[List[float]] = None,
+        category_affinity: Optional[Dict[int, float]] = None,
+        now: Optional[datetime] = None,
+        radius_km: float = MAX_DISTANCE_KM
+    ):
+        n = len(ads)
+        self.size = n
+        self.radius_km = radius_km
+        self.views = np.fromiter((ad.get("views", 0) for ad in ads), dtype=np.float64, count=n)
+        self.favorited = np.fromiter((ad.get("favorited", 0) for ad in ads), dtype=np.float64, count=n)
+        self.age_hours = self._age_hours(ads, now or datetime.utcnow())
+        self.distance_km = self._distance_km(ads, user_location)
+        self.affinity = self._affinity(ads, category_affinity or {})
+
+    @staticmethod
+    def _age_hours(ads: List[dict], now: datetime) -> np.ndarray:
+        stamps = [ad.get("time_created") or "" for ad in ads]
+        try:
+            created = np.array(stamps, dtype="datetime64[us]")
+        except ValueError:
+            # Fall back to element-wise parsing so one malformed stamp doesn't sink the batch
+            created = np.array([_parse_time(stamp) for stamp in stamps], dtype="datetime64[us]")
+        age = (np.datetime64(now, "us") - created) / np.timedelta64(1, "h")
+        return np.clip(age, 0, None)
+
+    @staticmethod
+    def _distance_km(ads: List[dict], user_location: Optional[List[float]]) -> np.ndarray:
+        n = len(ads)
+        # $geoNear already reported the distance in metres for geo feeds
+        distance = np.fromiter((ad.get("distance", np.nan) for ad in ads), dtype=np.float64, count=n) / 1000
+        missing = np.isnan(distance)
+        if user_location and missing.any():
+            locs = np.array([
+                ad["ad_loc"] if len(ad.get("ad_loc") or []) == 2 else (np.nan, np.nan)
+                for ad in ads
+            ], dtype=np.float64).reshape(n, 2)
+            computed = haversine_np(user_location[0], user_location[1], locs[:, 0], locs[:, 1])
+            distance = np.where(missing, computed, distance)
+        return distance
+
+    @staticmethod
+    def _affinity(ads: List[dict], category_affinity: Dict[int, float]) -> np.ndarray:
+        n = len(ads)
+        if not category_affinity or n == 0:
+            return np.zeros(n)
+        # Every ad gets a leading -1 category (affinity 0) so no segment is empty
+        categories = [[-1] + list(ad.get("category") or []) for ad in ads]
+        lengths = np.fromiter((len(cats) for cats in categories), dtype=np.int64, count=n)
+        flat = np.fromiter(chain.from_iterable(categories), dtype=np.int64, count=int(lengths.sum()))
+
+        keys = np.fromiter(category_affinity.keys(), dtype=np.int64, count=len(category_affinity))
+        values = np.fromiter(category_affinity.values(), dtype=np.float64, count=len(category_affinity))
+        order = np.argsort(keys)
+        keys, values = keys[order], values[order]
+        idx = np.clip(np.searchsorted(keys, flat), 0, len(keys) - 1)
+        weights = np.where(keys[idx] == flat, values[idx], 0.0)
+
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        return np.maximum.reduceat(weights, starts)
+
+def _parse_time(stamp: str):
+    try:
+        return np.datetime64(stamp, "us")
+    except ValueError:
+        return np.datetime64("NaT")
+
+def haversine_np(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Vectorised haversine distance in km, see utils.geo.haversine."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+def _normalise(values: np.ndarray) -> np.ndarray:
+    top = values.max() if values.size else 0
+    return values / top if top > 0 else np.zeros_like(values)
+
+# Registered score components, each maps a CandidateSet to scores in [0, 1]
+SCORE_COMPONENTS: Dict[str, Callable[[CandidateSet], np.ndarray]] = {}
+
+def score_component(name: str):
+    """Register a scoring function under the name used in FEED_SCORE_WEIGHTS."""
+    def register(fn: Callable[[CandidateSet], np.ndarray]):
+        SCORE_COMPONENTS[name] = fn
+        return fn
+    return register
+
+@score_component("recency")
+def recency_score(candidates: CandidateSet) -> np.ndarray:
+    # Exponential decay: an ad loses half its recency score every half-life
+    return np.nan_to_num(np.exp2(-candidates.age_hours / FEED_RECENCY_HALF_LIFE_HOURS))
+
+@score_component("distance")
+def distance_score(candidates: CandidateSet) -> np.ndarray:
+    return np.nan_to_num(1 - np.clip(candidates.distance_km / candidates.radius_km, 0, 1))
+
+@score_component("popularity")
+def popularity_score(candidates: CandidateSet) -> np.ndarray:
+    # A favorite says more than a view, log damping keeps viral ads from drowning the rest
+    return _normalise(np.log1p(candidates.views + 2 * candidates.favorited))
+
+@score_component("affinity")
+def affinity_score(candidates: CandidateSet) -> np.ndarray:
+    return _normalise(candidates.affinity)
+
+def score_candidates(candidates: CandidateSet, weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """Weighted sum of all score components for the whole batch."""
+    weights = FEED_SCORE_WEIGHTS if weights is None else weights
+    scores = np.zeros(candidates.size)
+    for name, weight in weights.items():
+        if weight:
+            scores += weight * SCORE_COMPONENTS[name](candidates)
+    return scores
+
+def rank_ads(
+    ads: List[dict],
+    user_location: Optional[List[float]] = None,
+    category_affinity: Optional[Dict[int, float]] = None,
+    weights: Optional[Dict[str, float]] = None,
+    radius_km: float = MAX_DISTANCE_KM
+) -> List[dict]:
+    """Return ads ordered by descending relevance score, ties keep their input order."""
+    if len(ads) < 2:
+        return list(ads)
+    candidates = CandidateSet(ads, user_location, category_affinity, radius_km=radius_km)
+    scores = score_candidates(candidates, weights)
+    order = np.argsort(-scores, kind="stable")
+    return [ads[i] for i in order]
\ No newline at end of file
@@ -0,0 +1,74 @@
+import hashlib
+from types import MappingProxyType
+from typing import List, Mapping, NamedTuple
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+class CategoryInfo(NamedTuple):
+    numb_id: int
+    name: str
+    int_date: int  # lifetime of an ad in this category, in days
+
+class SubCategoryInfo(NamedTuple):
+    numb_id: int
+    name: str
+    parent_id: int
+    parent_int_date: int
+
+class Taxonomy(NamedTuple):
+    categories: Mapping[int, CategoryInfo]
+    sub_categories: Mapping[int, SubCategoryInfo]
+    version: str  # hash of the contents, changes whenever a reload changed anything
+
+# Replaced as a whole on (re)load, never mutated, so readers need no locking
+_taxonomy = Taxonomy(MappingProxyType({}), MappingProxyType({}), "")
+
+async def load_taxonomy(db: AsyncIOMotorDatabase) -> Taxonomy:
+    """
+    Load the categories/sub_categories collections into memory. Called at startup
+    and again whenever the taxonomy changes (see reload_taxonomy).
+    """
+    global _taxonomy
+
+    categories = {}
+    async for doc in db.categories.find({}, {"numb_id": 1, "name": 1, "int_date": 1, "_id": 0}):
+        categories[doc["numb_id"]] = CategoryInfo(doc["numb_id"], doc["name"], doc.get("int_date", 0))
+
+    sub_categories = {}
+    async for doc in db.sub_categories.find({}, {"numb_id": 1, "name": 1, "parent_id": 1, "_id": 0}):
+        parent = categories.get(doc["parent_id"])
+        sub_categories[doc["numb_id"]] = SubCategoryInfo(
+            doc["numb_id"], doc["name"], doc["parent_id"], parent.int_date if parent else 0
+        )
+
+    version = hashlib.sha256(repr((list(categories.values()), list(sub_categories.values()))).encode()).hexdigest()[:16]
+    _taxonomy = Taxonomy(MappingProxyType(categories), MappingProxyType(sub_categories), version)
+    print(f"[INIT] Loaded taxonomy: {len(categories)} categories, {len(sub_categories)} sub-categories.")
+    return _taxonomy
+
+# Explicit hook for when the taxonomy collections were changed
+reload_taxonomy = load_taxonomy
+
+def get_taxonomy() -> Taxonomy:
+    return _taxonomy
+
+def resolve_parent_category(category_ids: List[int]) -> int:
+    """
+    Validate sub-category IDs against the in-memory taxonomy and return the
+    parent category they all belong to.
+    """
+    sub_categories = _taxonomy.sub_categories
+
+    parent_ids = set()
+    for category_id in category_ids:
+        sub_category = sub_categories.get(category_id)
+        if not sub_category:
+            raise HTTPException(status_code=400, detail=f"Category ID {category_id} is not valid.")
+        parent_ids.add(sub_category.parent_id)
+
+    if len(parent_ids) > 1:
+        raise HTTPException(status_code=400, detail="Provided category IDs belong to multiple unrelated categories.")
+    if not parent_ids:
+        raise HTTPException(status_code=400, detail="No valid parent category found for the provided category IDs.")
+
+    return parent_ids.pop()
@@ -0,0 +1,68 @@
+import asyncio
+from typing import Callable, Iterable, List
+from config import AD_IMAGE_UPLOAD_CONCURRENCY
+from utils.images import render_stored_variants
+from utils.objects import release_objects
+
+class VariantWorker:
+    """
+    Generates the thumb and detail variants of ad images that reached storage
+    without them (presigned uploads, bulk imports) in the background and adds
+    them to the ad's image_variants. Feed and detail pages serve the original
+    until then. Queued images are kept in memory only, an image whose variants
+    were lost with a restart keeps being served as its original.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._db = None
+        self._listeners: List[Callable[[str], None]] = []
+
+    def enqueue(self, ad_id: str, keys: Iterable[str]):
+        for key in keys:
+            self._queue.put_nowait((ad_id, key))
+
+    def on_variants(self, listener: Callable[[str], None]):
+        """Call listener(ad_id) once variants were added to an ad, e.g. to drop cached copies."""
+        self._listeners.append(listener)
+
+    async def process(self, ad_id: str, key: str):
+        variants = await render_stored_variants(self._db, key)
+        # Only the slot still holding this image, and only once
+        result = await self._db.ads.update_one(
+            {"ad_id": ad_id},
+            {"$set": {f"image_variants.$[slot].{name}": variant_key for name, variant_key in variants.items()}},
+            array_filters=[{"slot.original": key, "slot.thumb": {"$exists": False}}]
+        )
+        if not result.modified_count:
+            # The image or the ad was removed meanwhile
+            await release_objects(self._db, variants.values())
+            return
+        for listener in self._listeners:
+            listener(ad_id)
+
+    async def _run(self):
+        while True:
+            ad_id, key = await self._queue.get()
+            try:
+                await self.process(ad_id, key)
+            except Exception as e:
+                print(f"[ERROR] Generating variants of {key} failed, serving the original: {e}")
+            finally:
+                self._queue.task_done()
+
+    def start(self, db):
+        self._db = db
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+            print("[INIT] Started image variant workers.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+variant_worker = VariantWorker(AD_IMAGE_UPLOAD_CONCURRENCY)
\ No newline at end of file
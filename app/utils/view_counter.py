@@ -0,0 +1,121 @@
+import asyncio
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from config import VIEW_FLUSH_INTERVAL_MS, VIEW_FLUSH_MAX_PENDING, VIEW_FLUSH_BATCH_SIZE
+
+class ViewCounter:
+    """
+    Write-behind buffer for ad view counts. get_ad only bumps an in-process
+    counter, a background task writes the sums as one bulk_write of $inc
+    operations every VIEW_FLUSH_INTERVAL_MS, or sooner once VIEW_FLUSH_MAX_PENDING
+    views are waiting. Counts that are not in the database yet are added to
+    responses with merge_into so a viewer never sees the count go down.
+    """
+
+    def __init__(self, interval_ms: int, max_pending: int, batch_size: int):
+        self.interval = interval_ms / 1000
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._pending: Counter = Counter()
+        self._in_flight: Counter = Counter()
+        self._pending_total = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._db = None
+        self._flush_listeners: List[Callable[[str, int], None]] = []
+
+    def add(self, ad_id: str, count: int = 1):
+        self._pending[ad_id] += count
+        self._pending_total += count
+        if self._pending_total >= self.max_pending:
+            self._wakeup.set()
+
+    def unflushed(self, ad_id: str) -> int:
+        return self._pending.get(ad_id, 0) + self._in_flight.get(ad_id, 0)
+
+    def merge_into(self, ads: Iterable[dict]):
+        """Add views that are still buffered to ad documents read from the database."""
+        for ad in ads:
+            extra = self.unflushed(ad.get("ad_id"))
+            if extra:
+                ad["views"] = ad.get("views", 0) + extra
+
+    def on_flush(self, listener: Callable[[str, int], None]):
+        """Call listener(ad_id, count) once counts are written, e.g. to patch cached copies."""
+        self._flush_listeners.append(listener)
+
+    async def flush(self) -> int:
+        """Write all buffered views, returns how many were written."""
+        if not self._pending or self._db is None:
+            return 0
+
+        batch, self._pending, self._pending_total = self._pending, Counter(), 0
+        self._in_flight.update(batch)
+        written = 0
+        try:
+            items = list(batch.items())
+            for start in range(0, len(items), self.batch_size):
+                chunk = items[start:start + self.batch_size]
+                failed = set()
+                try:
+                    await self._db.ads.bulk_write(
+                        [UpdateOne({"ad_id": ad_id}, {"$inc": {"views": count}}) for ad_id, count in chunk],
+                        ordered=False
+                    )
+                except BulkWriteError as e:
+                    # The rest of the chunk was applied, only the failed operations are kept
+                    failed = {error["index"] for error in e.details["writeErrors"]}
+                    print(f"[ERROR] {len(failed)} view count updates failed, keeping them for the next flush")
+                for index, (ad_id, count) in enumerate(chunk):
+                    if index in failed:
+                        continue
+                    del batch[ad_id]
+                    del self._in_flight[ad_id]
+                    written += count
+                    for listener in self._flush_listeners:
+                        listener(ad_id, count)
+        except Exception as e:
+            print(f"[ERROR] Flushing view counts failed, keeping them for the next flush: {e}")
+        finally:
+            self._in_flight.clear()
+            # Whatever was not written goes back into the buffer, retried on the next tick
+            self._pending.update(batch)
+            self._pending_total += sum(batch.values())
+        return written
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self, db):
+        self._db = db
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+            print("[INIT] Started view counter flush task.")
+
+    async def stop(self):
+        """Stop the flush task and write what is left, called on graceful shutdown."""
+        if self._task is not None:
+            # Not cancelled: a bulk_write cancelled midway still reaches the database,
+            # its counts would go back into the buffer and be written twice. The task
+            # finishes the flush it is in and exits.
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        written = await self.flush()
+        print(f"[INIT] Flushed {written} buffered ad views.")
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": self._pending_total, "ads": len(self._pending)}
+
+view_counter = ViewCounter(VIEW_FLUSH_INTERVAL_MS, VIEW_FLUSH_MAX_PENDING, VIEW_FLUSH_BATCH_SIZE)
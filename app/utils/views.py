@@ -0,0 +1,14 @@
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+
+# Unique viewers live in ad_views, one {ad_id, uid} document per viewer. Ads created
+# before that carried them in a viewed_by array, never load it with an ad.
+AD_READ_PROJECTION = {"viewed_by": 0}
+
+async def record_view(db, ad_id: str, uid: str) -> bool:
+    """Remember that uid has seen the ad. Returns False if they had seen it before."""
+    try:
+        await db.ad_views.insert_one({"ad_id": ad_id, "uid": uid, "viewed_at": datetime.utcnow()})
+    except DuplicateKeyError:
+        return False
+    return True
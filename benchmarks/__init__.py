@@ -0,0 +1,98 @@
+"""
+Benchmarks of the hot paths, kept out of the app package. Run them from the
+repository root, e.g. python -m benchmarks.feed. They need the dev dependencies
+in requirements-dev.txt. The MongoDB ones (feed, search) use MONGO_URI, seed a
+scratch database next to DB_NAME and drop it again when done.
+"""
+import math
+import os
+import random
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+# The app runs from app/ with top-level imports (config, utils, routers, ...)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from config import MONGO_URI, DB_NAME
+from utils.geo import to_geo_point
+
+# Around Hyderabad, ads are spread over roughly +-50 km
+BENCH_CENTER = [17.385, 78.4867]
+NOUNS = [
+    "bike", "sofa", "phone", "laptop", "table", "chair", "camera", "guitar", "watch", "bed",
+    "fridge", "scooter", "car", "desk", "lamp", "shoes", "jacket", "tv", "speaker", "tablet"
+]
+WORDS = [f"{prefix}{i}" for prefix in ("brand", "model", "colour") for i in range(2000)]
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to the server, i.e. round trips."""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+@asynccontextmanager
+async def bench_database():
+    """Yields (db, command counter) for a scratch database that is dropped afterwards."""
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(MONGO_URI or "mongodb://localhost:27017", event_listeners=[counter])
+    db = client[f"{DB_NAME or 'listinker'}_bench"]
+    await client.drop_database(db.name)
+    try:
+        yield db, counter
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+def bench_ad(i: int, now: datetime, categories: int) -> dict:
+    location = [BENCH_CENTER[0] + random.uniform(-0.45, 0.45), BENCH_CENTER[1] + random.uniform(-0.45, 0.45)]
+    noun = random.choice(NOUNS)
+    return {
+        "ad_id": f"bench-{i:07d}",
+        "title": f"{random.choice(WORDS)} {noun} {random.choice(WORDS)}",
+        "description": " ".join(random.choices(WORDS, k=12) + [noun]),
+        "price": random.randint(100, 100_000),
+        "image": [],
+        "image_variants": [],
+        "category": [random.randint(1, categories)],
+        "ad_loc": location,
+        "ad_geo": to_geo_point(location),
+        "time_created": (now - timedelta(seconds=i)).isoformat(),
+        "expires_at": None,
+        "owner": f"bench-owner-{i % 500}",
+        "status": "active",
+        "views": random.randint(0, 5000),
+        "favorited": random.randint(0, 200)
+    }
+
+async def seed_ads(db, count: int, categories: int = 40, batch_size: int = 10_000):
+    now = datetime.utcnow()
+    for start in range(0, count, batch_size):
+        await db.ads.insert_many(
+            [bench_ad(i, now, categories) for i in range(start, min(start + batch_size, count))], ordered=False
+        )
+    await db.users.insert_many(
+        [{"uid": f"bench-owner-{i}", "username": f"owner{i}"} for i in range(500)], ordered=False
+    )
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+def report(name: str, samples_ms: List[float], round_trips: Optional[float] = None):
+    line = f"{name}: p50 {percentile(samples_ms, 50):.1f} ms, p95 {percentile(samples_ms, 95):.1f} ms"
+    if round_trips is not None:
+        line += f", {round_trips:.1f} round trips per request"
+    print(line)
@@ -0,0 +1,113 @@
+"""
+First feed page of users with a history: the loop the feed used to run, one
+find().skip() per ranked category until the page is full, a filler query and a
+distance filter in Python, against the single aggregation of
+fetch_personalised_ads. Reports round trips and latency.
+
+    python -m benchmarks.feed [ads] [categories] [requests]
+
+Round trips grow with the number of categories a page has to walk through, so
+many categories with few ads each nearby is the interesting case.
+"""
+import asyncio
+import random
+import sys
+import time
+from collections import Counter
+from pymongo import DESCENDING, GEOSPHERE
+from typing import List, Optional
+from config import MAX_DISTANCE_KM
+from routers.ads import fetch_personalised_ads, get_feed_user, history_category_affinity
+from utils.geo import haversine
+from utils.expiry import live_ads_filter
+from benchmarks import BENCH_CENTER, bench_database, seed_ads, report
+
+PAGE_SIZE = 15
+USERS = 50
+HISTORY_LENGTH = 15
+
+# Fields the original feed read per ad
+LEGACY_PROJECTION = {
+    "title": 1, "description": 1, "image": 1, "views": 1, "favorited": 1, "owner": 1,
+    "ad_id": 1, "ad_loc": 1, "time_created": 1, "category": 1
+}
+
+def legacy_nearby(ads: list, user_location: Optional[List[float]], ads_to_show: list, page_size: int):
+    # The original feed filtered the distance in Python after fetching
+    for ad in ads:
+        if user_location and ad.get("ad_loc"):
+            if haversine(user_location[0], user_location[1], ad["ad_loc"][0], ad["ad_loc"][1]) > MAX_DISTANCE_KM:
+                continue
+        ads_to_show.append(ad)
+        if len(ads_to_show) >= page_size:
+            break
+
+async def legacy_personalised_page(db, uid: str, query: dict, page_size: int, offset: int = 0) -> list:
+    """The personalised branch of the original get_ads, query for query."""
+    user = await db.users.find_one({"uid": uid}, {"history": 1, "user_location": 1})
+    history_ids = user.get("history", [])
+    user_location = user.get("user_location")
+    history_ads = await db.ads.find({"ad_id": {"$in": history_ids}}, {"ad_id": 1, "category": 1}).to_list(100)
+    ranked_cats = [cat for cat, _ in Counter(cat for ad in history_ads for cat in ad.get("category", [])).most_common()]
+
+    ads_to_show = []
+    for cat in ranked_cats:
+        ads = await db.ads.find(
+            {"category": cat, "ad_id": {"$nin": history_ids}, **query}, LEGACY_PROJECTION
+        ).skip(offset).limit(page_size).sort("time_created", DESCENDING).to_list(page_size)
+        legacy_nearby(ads, user_location, ads_to_show, page_size)
+        if len(ads_to_show) >= page_size:
+            break
+
+    if len(ads_to_show) < page_size:
+        seen_ids = [ad["ad_id"] for ad in ads_to_show] + [ad["ad_id"] for ad in history_ads]
+        filler_ads = await db.ads.find(
+            {"ad_id": {"$nin": seen_ids}}, LEGACY_PROJECTION
+        ).skip(offset).limit(page_size).to_list(page_size)
+        legacy_nearby(filler_ads, user_location, ads_to_show, page_size)
+    return ads_to_show[:page_size]
+
+async def personalised_page(db, uid: str, query: dict, page_size: int) -> list:
+    user = await get_feed_user(db, uid)
+    ranked_cats = [cat for cat, _ in history_category_affinity(user.get("history_ads", [])).most_common()]
+    return await fetch_personalised_ads(
+        db, query, user.get("user_location"), user.get("history", []), ranked_cats, page_size
+    )
+
+async def main(ad_count: int, categories: int, requests: int):
+    async with bench_database() as (db, counter):
+        print(f"Seeding {ad_count} ads over {categories} categories...")
+        await seed_ads(db, ad_count, categories)
+        await db.ads.create_index([("ad_geo", GEOSPHERE)])
+        await db.ads.create_index([("time_created", DESCENDING), ("ad_id", DESCENDING)])
+
+        ad_ids = [f"bench-{i:07d}" for i in random.sample(range(ad_count), USERS * HISTORY_LENGTH)]
+        await db.users.insert_many([
+            {
+                "uid": f"bench-user-{u}",
+                "history": ad_ids[u * HISTORY_LENGTH:(u + 1) * HISTORY_LENGTH],
+                "user_location": [BENCH_CENTER[0] + random.uniform(-0.2, 0.2), BENCH_CENTER[1] + random.uniform(-0.2, 0.2)]
+            }
+            for u in range(USERS)
+        ])
+
+        variants = {"loop": legacy_personalised_page, "aggregation": personalised_page}
+        samples = {name: [] for name in variants}
+        round_trips = {name: 0 for name in variants}
+        for i in range(requests):
+            uid = f"bench-user-{i % USERS}"
+            # Interleaved so both see the same cache state
+            for name, fetch in variants.items():
+                query = {"expires_at": live_ads_filter()}
+                before = counter.count
+                start = time.perf_counter()
+                await fetch(db, uid, query, PAGE_SIZE)
+                samples[name].append((time.perf_counter() - start) * 1000)
+                round_trips[name] += counter.count - before
+
+        for name in variants:
+            report(f"Personalised feed ({name})", samples[name], round_trips[name] / requests)
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    asyncio.run(main(*(args + [100_000, 1000, 200][len(args):])))
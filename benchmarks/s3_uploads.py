@@ -0,0 +1,55 @@
+"""
+Latency of other requests while images upload, against a local S3 stand-in
+(moto) whose every request takes latency_ms like a real network transfer.
+A request here is a coroutine that awaits a 5 ms database call, its p95 stays close
+to that when uploads run off the event loop.
+
+    python -m benchmarks.s3_uploads [uploads] [latency_ms]
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+import boto3
+from fastapi import UploadFile
+from moto import mock_aws
+from utils.s3 import S3Client
+from benchmarks import report
+
+BUCKET = "bench-images"
+REQUEST_MS = 5
+
+async def request_latencies(until: asyncio.Future) -> list:
+    samples = []
+    while not until.done():
+        start = time.perf_counter()
+        await asyncio.sleep(REQUEST_MS / 1000)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+async def main(uploads: int, latency_ms: int):
+    client = S3Client()
+    client.bucket_name = BUCKET
+    client.s3_client = boto3.client(
+        "s3", region_name="us-east-1", aws_access_key_id="bench", aws_secret_access_key="bench"
+    )
+    client.s3_client.create_bucket(Bucket=BUCKET)
+    client.s3_client.meta.events.register("before-sign.s3", lambda **kwargs: time.sleep(latency_ms / 1000))
+
+    idle = asyncio.get_running_loop().create_future()
+    asyncio.get_running_loop().call_later(1, idle.set_result, None)
+    report("Requests, no uploads", await request_latencies(idle))
+
+    files = [UploadFile(io.BytesIO(os.urandom(512 * 1024)), filename=f"{i}.jpg") for i in range(uploads)]
+    start = time.perf_counter()
+    busy = asyncio.ensure_future(asyncio.gather(*(client.upload_file(file) for file in files)))
+    report(f"Requests, {uploads} uploads in flight", await request_latencies(busy))
+    await busy
+    print(f"{uploads} uploads took {time.perf_counter() - start:.2f} s")
+    client.shutdown()
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    with mock_aws():
+        asyncio.run(main(*(args + [64, 100][len(args):])))
@@ -0,0 +1,34 @@
+"""
+Ranking 10,000 feed candidates with the NumPy scoring engine (utils.scoring).
+
+    python -m benchmarks.scoring
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from utils.scoring import rank_ads
+
+def main():
+    now = datetime.utcnow()
+    candidates = [
+        {
+            "ad_id": str(i),
+            "views": random.randint(0, 5000),
+            "favorited": random.randint(0, 200),
+            "time_created": (now - timedelta(minutes=random.randint(0, 60 * 24 * 60))).isoformat(),
+            "ad_loc": [17.38 + random.uniform(-0.2, 0.2), 78.48 + random.uniform(-0.2, 0.2)],
+            "category": random.sample(range(1, 200), random.randint(1, 3))
+        }
+        for i in range(10_000)
+    ]
+    affinity = {cat: random.randint(1, 10) for cat in random.sample(range(1, 200), 15)}
+
+    runs = 20
+    start = time.perf_counter()
+    for _ in range(runs):
+        rank_ads(candidates, [17.38, 78.48], affinity)
+    elapsed = (time.perf_counter() - start) / runs
+    print(f"Ranked {len(candidates)} candidates in {elapsed * 1000:.2f} ms per run")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+GET /ads/search against a large ad collection, target under 50 ms p95.
+
+    python -m benchmarks.search [ads] [requests]
+
+Queries are one or two words taken from seeded titles, run anonymously and for
+a user with a location (radius filter), through the endpoint function itself.
+"""
+import asyncio
+import random
+import sys
+import time
+from pymongo import GEOSPHERE, TEXT
+from routers.ads import search_ads
+from benchmarks import BENCH_CENTER, NOUNS, WORDS, bench_database, seed_ads, report
+
+PAGE_SIZE = 15
+
+def random_query() -> str:
+    # A brand or model word, optionally with the kind of item
+    words = [random.choice(WORDS)]
+    if random.random() < 0.5:
+        words.append(random.choice(NOUNS))
+    return " ".join(words)
+
+async def main(ad_count: int, requests: int):
+    async with bench_database() as (db, counter):
+        print(f"Seeding {ad_count} ads...")
+        await seed_ads(db, ad_count)
+        await db.ads.create_index([("ad_geo", GEOSPHERE)])
+        # Same text index as initialize_ads_collection
+        await db.ads.create_index(
+            [("title", TEXT), ("description", TEXT)], weights={"title": 3, "description": 1}, name="ads_text_search"
+        )
+        await db.users.insert_one({"uid": "bench-user", "user_location": BENCH_CENTER})
+
+        for name, uid in (("anonymous", None), ("with location", "bench-user")):
+            samples = []
+            before = counter.count
+            for _ in range(requests):
+                start = time.perf_counter()
+                await search_ads(
+                    q=random_query(), uid=uid, category=None, min_price=None, max_price=None,
+                    radius_km=None, page=1, page_size=PAGE_SIZE, db=db
+                )
+                samples.append((time.perf_counter() - start) * 1000)
+            report(f"Search ({name})", samples, (counter.count - before) / requests)
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    asyncio.run(main(*(args + [1_000_000, 500][len(args):])))
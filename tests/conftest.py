@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app runs from app/ with top-level imports (config, utils, routers, ...)
+# boto3 needs a valid storage endpoint when utils.s3 is imported, set before config loads
+os.environ.setdefault("AWS_REGION", "us-east-1")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
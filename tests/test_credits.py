@@ -0,0 +1,118 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+from utils.credits import consume_credit, refund_credits, reserve_credits
+
+class FakeCollection:
+    """
+    In-memory stand-in for the parts of a motor collection the credit helpers use.
+    Every call yields to the event loop first, like a round trip to MongoDB, so
+    concurrent callers interleave between their reads and writes.
+    """
+
+    def __init__(self, docs):
+        self.docs = [dict(doc, _id=i) for i, doc in enumerate(docs)]
+
+    @staticmethod
+    def _matches(doc, query):
+        for field, condition in query.items():
+            value = doc.get(field)
+            if isinstance(condition, dict):
+                if "$gt" in condition and not (value is not None and value > condition["$gt"]):
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    @staticmethod
+    def _apply(doc, update):
+        for field, amount in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + amount
+        doc.update(update.get("$set", {}))
+
+    def _first(self, query):
+        return next((doc for doc in self.docs if self._matches(doc, query)), None)
+
+    async def find_one(self, query, projection=None):
+        await asyncio.sleep(0)
+        doc = self._first(query)
+        return dict(doc) if doc else None
+
+    async def find_one_and_update(self, query, update, projection=None):
+        await asyncio.sleep(0)
+        doc = self._first(query)
+        if doc is None:
+            return None
+        before = dict(doc)
+        self._apply(doc, update)
+        return before
+
+    async def update_one(self, query, update):
+        await asyncio.sleep(0)
+        doc = self._first(query)
+        if doc is not None:
+            self._apply(doc, update)
+        return SimpleNamespace(matched_count=int(doc is not None), modified_count=int(doc is not None))
+
+def make_db(free, paid):
+    return {
+        "free_credits": FakeCollection([{"UID": "u1", "category": 1, "credits": free}]),
+        "paid_credits": FakeCollection([{"UID": "u1", "category": 1, "credits": paid}])
+    }
+
+def balances(db):
+    return db["free_credits"].docs[0]["credits"], db["paid_credits"].docs[0]["credits"]
+
+def test_parallel_posts_never_spend_more_than_available():
+    db = make_db(free=1, paid=3)
+
+    async def post_many():
+        return await asyncio.gather(*(consume_credit(db, "u1", 1) for _ in range(20)))
+
+    pools = asyncio.run(post_many())
+
+    assert pools.count("free_credits") == 1
+    assert pools.count("paid_credits") == 3
+    assert pools.count(None) == 16
+    assert balances(db) == (0, 0)
+
+def test_parallel_reservations_never_spend_more_than_available():
+    db = make_db(free=2, paid=5)
+    counts = [3, 1, 4, 2, 5, 1]
+
+    async def reserve_many():
+        return await asyncio.gather(*(reserve_credits(db, "u1", 1, count) for count in counts))
+
+    reserved = asyncio.run(reserve_many())
+
+    taken = list(itertools.chain.from_iterable(reserved))
+    assert taken.count("free_credits") == 2
+    assert taken.count("paid_credits") == 5
+    assert all(len(pools) <= count for pools, count in zip(reserved, counts))
+    assert balances(db) == (0, 0)
+
+def test_reservations_and_posts_mixed_stay_within_balance():
+    db = make_db(free=3, paid=4)
+
+    async def mixed():
+        posts = [consume_credit(db, "u1", 1) for _ in range(5)]
+        reservations = [reserve_credits(db, "u1", 1, 3) for _ in range(3)]
+        return await asyncio.gather(*posts, *reservations)
+
+    results = asyncio.run(mixed())
+
+    posted = [pool for pool in results[:5] if pool]
+    reserved = list(itertools.chain.from_iterable(results[5:]))
+    assert len(posted) + len(reserved) == 7
+    assert balances(db) == (0, 0)
+
+def test_refunded_reservation_goes_back_to_its_pool():
+    db = make_db(free=1, paid=2)
+
+    async def reserve_and_refund():
+        pools = await reserve_credits(db, "u1", 1, 3)
+        await refund_credits(db, "u1", 1, pools[1:])
+        return pools
+
+    assert asyncio.run(reserve_and_refund()) == ["free_credits", "paid_credits", "paid_credits"]
+    assert balances(db) == (0, 2)
@@ -0,0 +1,27 @@
+import pytest
+from fastapi import HTTPException
+from utils.cursor import encode_cursor, decode_cursor
+
+def test_round_trip():
+    position = {"ring": 1, "phase": 2, "key": [1532.5, "ad-1"], "cats": [4, 7]}
+    assert decode_cursor(encode_cursor(position)) == position
+    assert decode_cursor(encode_cursor({"key": ["2024-01-01T00:00:00", "ad-2"]}))["key"][1] == "ad-2"
+
+@pytest.mark.parametrize("position", [
+    {"ring": "1"},
+    {"ring": -1},
+    {"phase": True},
+    {"key": [1.0]},
+    {"key": [{"$exists": True}, "ad-1"]},
+    {"key": [1.0, {"$gt": ""}]},
+    {"cats": list(range(1000))},
+    {"cats": ["4"]},
+])
+def test_malformed_positions_are_rejected(position):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(encode_cursor(position))
+    assert error.value.status_code == 400
+
+def test_garbage_is_rejected():
+    with pytest.raises(HTTPException):
+        decode_cursor("not a cursor!")
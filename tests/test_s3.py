@@ -0,0 +1,77 @@
+import asyncio
+import io
+import os
+import time
+import pytest
+
+moto = pytest.importorskip("moto")
+
+import boto3
+from fastapi import UploadFile
+from utils.s3 import S3Client, MB
+
+BUCKET = "bucket1"
+
+@pytest.fixture
+def s3():
+    with moto.mock_aws():
+        client = S3Client()
+        client.bucket_name = BUCKET
+        # Same client settings minus the storage endpoint, which moto doesn't intercept
+        client.s3_client = boto3.client(
+            "s3", region_name="us-east-1", aws_access_key_id="testing", aws_secret_access_key="testing"
+        )
+        client.s3_client.create_bucket(Bucket=BUCKET)
+        yield client
+        client.shutdown()
+
+def upload(data: bytes, filename: str = "photo.JPG") -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename=filename, size=len(data))
+
+def test_upload_file_is_content_addressed(s3):
+    async def run():
+        first = await s3.upload_file(upload(b"same photo"))
+        second = await s3.upload_file(upload(b"same photo", "copy.jpg"))
+        return first, second, await s3.get_object_size(first)
+
+    first, second, size = asyncio.run(run())
+
+    assert first == second
+    assert first.endswith(".jpg")
+    assert size == len(b"same photo")
+
+def test_large_uploads_are_streamed_in_parts(s3):
+    data = os.urandom(9 * MB)
+
+    async def run():
+        key = await s3.upload_file(upload(data), "big.jpg")
+        return await s3.get_object_size(key)
+
+    assert asyncio.run(run()) == len(data)
+    assert s3.s3_client.get_object(Bucket=BUCKET, Key="big.jpg")["Body"].read() == data
+
+def test_upload_bytes_and_delete(s3):
+    async def run():
+        key = await s3.upload_bytes(b"thumb", "a_thumb.webp", "image/webp")
+        stored = await s3.object_exists(key)
+        await s3.delete_file(key)
+        return stored, await s3.object_exists(key), await s3.get_object_size(key)
+
+    assert asyncio.run(run()) == (True, False, None)
+
+def test_event_loop_stays_responsive_during_uploads(s3):
+    # Every request to the stand-in blocks its thread like a slow network would
+    s3.s3_client.meta.events.register("before-sign.s3", lambda **kwargs: time.sleep(0.2))
+
+    async def run():
+        uploads = asyncio.gather(*(s3.upload_file(upload(os.urandom(64 * 1024), f"{i}.jpg")) for i in range(8)))
+        lags = []
+        while not uploads.done():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+        await uploads
+        return max(lags)
+
+    # Blocking uploads would stall the loop for at least 0.2 s per request
+    assert asyncio.run(run()) < 0.1